@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def yatube_test_settings():
+    """Те же подмены настроек, что и у manage.py test."""
+    from django.test.utils import override_settings
+
+    from core.runner import test_overrides
+    from posts.caching import flush_page_stats
+
+    with override_settings(**test_overrides()):
+        yield
+        flush_page_stats()
@@ -0,0 +1,369 @@
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS cache_entries_accessed
+    ON cache_entries (accessed)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    INSERT OR IGNORE INTO cache_stats (name)
+    VALUES ('hits'), ('misses'), ('entries'), ('evictions')
+    ''',
+    # Число записей ведут триггеры, чтобы не считать COUNT(*) на каждый set.
+    '''
+    CREATE TRIGGER IF NOT EXISTS cache_entries_ai
+    AFTER INSERT ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value + 1 WHERE name = 'entries';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS cache_entries_ad
+    AFTER DELETE ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value - 1 WHERE name = 'entries';
+    END
+    ''',
+)
+UPSERT = '''
+INSERT INTO cache_entries (key, value, expires, accessed)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed
+'''
+# Старые сборки SQLite ограничивают запрос 999 параметрами.
+MAX_VARIABLES = 500
+COUNT = 'UPDATE cache_stats SET value = value + ? WHERE name = ?'
+# Чтение не пишет в базу: время доступа для LRU обновляется, только если
+# устарело больше чем на ACCESS_RESOLUTION секунд, а счётчики попаданий
+# копятся в процессе и сбрасываются в базу раз в FLUSH_INTERVAL секунд.
+ACCESS_RESOLUTION = 60
+FLUSH_INTERVAL = 10
+
+logger = logging.getLogger(__name__)
+
+
+def _is_alive(expires, now):
+    return expires is None or expires > now
+
+
+def _fail_safe(default):
+    """Занятая или недоступная база не роняет запрос: операция
+    пропускается и возвращает default.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except sqlite3.OperationalError as error:
+                logger.warning('Кэш недоступен для записи: %s', error)
+                return default
+        return wrapper
+    return decorator
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на одном хосте.
+
+    LOCATION — путь к файлу или URI вида file:...; OPTIONS MAX_ENTRIES
+    и CULL_FREQUENCY работают как у встроенных бэкендов, но вытесняются
+    давно не читавшиеся записи. Занятая база не роняет запрос: чтение
+    становится промахом, запись пропускается.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._location = location
+        self._timeout_connect = options.get('CONNECT_TIMEOUT', 5)
+        self._access_resolution = options.get(
+            'ACCESS_RESOLUTION', ACCESS_RESOLUTION)
+        self._flush_interval = options.get('FLUSH_INTERVAL', FLUSH_INTERVAL)
+        self._db = None
+        self._pid = None
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self._hits = 0
+        self._misses = 0
+        self._accessed = set()
+        self._expired = set()
+        self._flushed = time.monotonic()
+
+    def _connection(self):
+        # После fork соединение SQLite использовать нельзя.
+        if self._db is None or self._pid != os.getpid():
+            self._db = self._connect()
+            self._pid = os.getpid()
+        return self._db
+
+    def _connect(self):
+        uri = self._location.startswith('file:')
+        if not uri:
+            directory = os.path.dirname(os.path.abspath(self._location))
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(
+            self._location,
+            timeout=self._timeout_connect,
+            isolation_level=None,
+            check_same_thread=False,
+            uri=uri,
+        )
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        with self._transaction(db):
+            for statement in SCHEMA:
+                db.execute(statement)
+        return db
+
+    @contextmanager
+    def _transaction(self, db=None):
+        db = db or self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _read(self, keys, now):
+        """Живые значения по ключам, без транзакции на запись."""
+        found = {}
+        try:
+            db = self._connection()
+            for start in range(0, len(keys), MAX_VARIABLES):
+                chunk = keys[start:start + MAX_VARIABLES]
+                for key, value, expires, accessed in db.execute(
+                    'SELECT key, value, expires, accessed FROM cache_entries '
+                    f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                    chunk,
+                ):
+                    if not _is_alive(expires, now):
+                        self._expired.add(key)
+                        continue
+                    found[key] = value
+                    if now - accessed >= self._access_resolution:
+                        self._accessed.add(key)
+        except sqlite3.OperationalError as error:
+            logger.warning('Кэш недоступен для чтения: %s', error)
+            found = {}
+        self._hits += len(found)
+        self._misses += len(keys) - len(found)
+        if time.monotonic() - self._flushed >= self._flush_interval:
+            self._flush()
+        return found
+
+    def _apply_pending(self, db, now):
+        """Переносит в базу накопленные при чтении LRU и счётчики."""
+        db.executemany(
+            'UPDATE cache_entries SET accessed = ? WHERE key = ?',
+            [(now, key) for key in self._accessed],
+        )
+        db.executemany(
+            'DELETE FROM cache_entries WHERE key = ? AND expires <= ?',
+            [(key, now) for key in self._expired],
+        )
+        db.execute(COUNT, (self._hits, 'hits'))
+        db.execute(COUNT, (self._misses, 'misses'))
+        self._reset_pending()
+
+    def _flush(self):
+        try:
+            with self._transaction() as db:
+                self._apply_pending(db, time.time())
+        except sqlite3.OperationalError as error:
+            # Счётчики останутся в памяти до следующей попытки.
+            logger.warning('Кэш не сохранил статистику: %s', error)
+            self._flushed = time.monotonic()
+
+    def _write(self, db, items, timeout, now):
+        # Блокировка на запись уже взята: заодно сбрасываем накопленное.
+        self._apply_pending(db, now)
+        expires = self.get_backend_timeout(timeout)
+        db.executemany(
+            UPSERT,
+            [
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 expires, now)
+                for key, value in items
+            ],
+        )
+        self._cull(db, now)
+
+    def _cull(self, db, now):
+        entries, = db.execute(
+            "SELECT value FROM cache_stats WHERE name = 'entries'"
+        ).fetchone()
+        if entries <= self._max_entries:
+            return
+        db.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (now,))
+        entries, = db.execute(
+            "SELECT value FROM cache_stats WHERE name = 'entries'"
+        ).fetchone()
+        if entries <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            keep = 0
+        else:
+            keep = self._max_entries - (
+                self._max_entries // self._cull_frequency)
+        excess = entries - keep
+        db.execute(
+            'DELETE FROM cache_entries WHERE key IN ('
+            'SELECT key FROM cache_entries ORDER BY accessed LIMIT ?)',
+            (excess,),
+        )
+        db.execute(COUNT, (excess, 'evictions'))
+
+    @_fail_safe(False)
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT expires FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and _is_alive(row[0], now):
+                return False
+            self._write(db, [(key, value)], timeout, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._read([key], time.time())
+        if key not in found:
+            return default
+        return pickle.loads(found[key])
+
+    @_fail_safe(None)
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            self._write(db, [(key, value)], timeout, time.time())
+
+    @_fail_safe(False)
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                'UPDATE cache_entries SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now),
+            )
+        return cursor.rowcount > 0
+
+    @_fail_safe(False)
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            cursor = db.execute(
+                'DELETE FROM cache_entries WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._read([key], time.time())
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        try:
+            with self._transaction() as db:
+                row = db.execute(
+                    'SELECT value, expires FROM cache_entries WHERE key = ?',
+                    (key,),
+                ).fetchone()
+                if row is None or not _is_alive(row[1], now):
+                    raise ValueError("Key '%s' not found" % key)
+                value = pickle.loads(row[0]) + delta
+                db.execute(
+                    'UPDATE cache_entries SET value = ?, accessed = ? '
+                    'WHERE key = ?',
+                    (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now, key),
+                )
+        except sqlite3.OperationalError as error:
+            # Как и для отсутствующего ключа: вызывающий код решит сам,
+            # записать ли значение заново.
+            logger.warning('Кэш недоступен для записи: %s', error)
+            raise ValueError("Key '%s' is not available" % key)
+        return value
+
+    def get_many(self, keys, version=None):
+        """Значения читаются одним запросом на пачку ключей."""
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        found = self._read(list(keys), time.time())
+        return {
+            keys[key]: pickle.loads(value) for key, value in found.items()
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """Все значения записываются в одной транзакции.
+
+        Если база занята, возвращает ключи, которые не записались.
+        """
+        items = [
+            (self._key(key, version), value) for key, value in data.items()
+        ]
+        if not items:
+            return []
+        try:
+            with self._transaction() as db:
+                self._write(db, items, timeout, time.time())
+        except sqlite3.OperationalError as error:
+            logger.warning('Кэш недоступен для записи: %s', error)
+            return list(data)
+        return []
+
+    @_fail_safe(None)
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        with self._transaction() as db:
+            db.executemany('DELETE FROM cache_entries WHERE key = ?', keys)
+
+    @_fail_safe(None)
+    def clear(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache_entries')
+
+    def stats(self):
+        """Счётчики попаданий, промахов, записей и вытеснений."""
+        self._flush()
+        try:
+            return dict(self._connection().execute(
+                'SELECT name, value FROM cache_stats'))
+        except sqlite3.OperationalError as error:
+            logger.warning('Кэш недоступен для чтения: %s', error)
+            return {}
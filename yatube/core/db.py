@@ -0,0 +1,22 @@
+import re
+
+from django.conf import settings
+
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(cursor, pragmas):
+    """Выполняет PRAGMA из словаря; значения — числа или слова."""
+    for name, value in pragmas.items():
+        value = str(value)
+        if not (name.isidentifier() and PRAGMA_VALUE.match(value)):
+            raise ValueError(f'Неверная настройка SQLite: {name}={value}')
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение с SQLite по SQLITE_PRAGMAS."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
@@ -0,0 +1,158 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE posts (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date REAL)',
+    'CREATE INDEX posts_author ON posts (author_id, pub_date)',
+    'CREATE TABLE stats (author_id INTEGER PRIMARY KEY, posts INTEGER)',
+)
+AUTHORS = 100
+
+
+def _prepare(path, rows):
+    db = sqlite3.connect(path, isolation_level=None)
+    for statement in SCHEMA:
+        db.execute(statement)
+    db.execute('BEGIN')
+    db.executemany(
+        'INSERT INTO posts (author_id, text, pub_date) VALUES (?, ?, ?)',
+        ((number % AUTHORS, 'x' * 200, number) for number in range(rows)),
+    )
+    db.executemany(
+        'INSERT INTO stats VALUES (?, ?)',
+        ((author, rows // AUTHORS) for author in range(AUTHORS)),
+    )
+    db.execute('COMMIT')
+    db.close()
+
+
+def _write(db, author):
+    # Как post_create: пост и счётчик автора в одной транзакции.
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute(
+            'INSERT INTO posts (author_id, text, pub_date) VALUES (?, ?, ?)',
+            (author, 'x' * 200, time.time()),
+        )
+        db.execute(
+            'UPDATE stats SET posts = posts + 1 WHERE author_id = ?',
+            (author,))
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+def _read(db, author):
+    # Как страница профиля: последние посты автора.
+    db.execute(
+        'SELECT id, text FROM posts WHERE author_id = ? '
+        'ORDER BY pub_date DESC LIMIT 10',
+        (author,),
+    ).fetchall()
+
+
+def _worker(path, pragmas, deadline, write_ratio, seed, results):
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    apply_pragmas(db, pragmas)
+    rng = random.Random(seed)
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    while time.monotonic() < deadline:
+        author = rng.randrange(AUTHORS)
+        try:
+            if rng.random() < write_ratio:
+                _write(db, author)
+                counts['writes'] += 1
+            else:
+                _read(db, author)
+                counts['reads'] += 1
+        except sqlite3.OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            counts['locked'] += 1
+    db.close()
+    results.append(counts)
+
+
+def run_benchmark(pragmas, threads, seconds, write_ratio, rows):
+    """Операции в секунду для смешанной нагрузки на временной базе."""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        _prepare(path, rows)
+        results = []
+        deadline = time.monotonic() + seconds
+        workers = [
+            threading.Thread(
+                target=_worker,
+                args=(path, pragmas, deadline, write_ratio, seed, results),
+            )
+            for seed in range(threads)
+        ]
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        key: sum(counts[key] for counts in results) / elapsed
+        for key in ('reads', 'writes', 'locked')
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite с настройками по умолчанию и с SQLITE_PRAGMAS '
+        'на смешанной нагрузке чтения и записи'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Сколько соединений работают одновременно',
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность каждого замера',
+        )
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Доля запросов на запись',
+        )
+        parser.add_argument(
+            '--rows', type=int, default=50000,
+            help='Сколько постов в базе перед замером',
+        )
+
+    def handle(self, *args, **options):
+        profiles = (
+            ('по умолчанию', {}),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS),
+        )
+        for label, pragmas in profiles:
+            result = run_benchmark(
+                pragmas,
+                options['threads'],
+                options['seconds'],
+                options['write_ratio'],
+                options['rows'],
+            )
+            self.stdout.write(
+                f'{label}: чтений {result["reads"]:.0f}/с, '
+                f'записей {result["writes"]:.0f}/с, '
+                f'ошибок блокировки {result["locked"]:.0f}/с'
+            )
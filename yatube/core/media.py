@@ -0,0 +1,157 @@
+import mimetypes
+import os
+import re
+import stat
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Имена по хешу: картинки posts/ab/cd/<sha256>.<ext>, их варианты
+# .../<sha256>/<ширина>.<ext> и миниатюры sorl-thumbnail cache/ab/cd/<md5>.
+IMMUTABLE = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32,64}(/\d+)?\.\w+$')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MAX_AGE = 60 * 60
+
+
+class RangeFile:
+    """Файл, из которого читается только диапазон [start, end]."""
+
+    def __init__(self, file, start, end):
+        file.seek(start)
+        self.file = file
+        self.left = end - start + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.left:
+            size = self.left
+        data = self.file.read(size)
+        self.left -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Один диапазон байт из заголовка Range как (start, end).
+
+    None — заголовок не разобран или диапазонов несколько, файл отдаётся
+    целиком; ValueError — диапазон за пределами файла.
+    """
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        raise ValueError(header)
+    if start > end:
+        return None
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if value is None:
+        return True
+    if value == etag:
+        return True
+    return parse_http_date_safe(value) == int(mtime)
+
+
+def _headers(response, name, etag, mtime):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if IMMUTABLE.search(name):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MAX_AGE)
+    return response
+
+
+def _offload(path, name, content_type):
+    """Ответ, который файл отдаст стоящий перед приложением прокси."""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE_HEADER == 'X-Accel-Redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_REDIRECT_PREFIX + name)
+    else:
+        response[settings.MEDIA_SENDFILE_HEADER] = path
+    return response
+
+
+def _stat(path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(fullpath)
+    except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+    return fullpath, stat_result
+
+
+def _file_response(request, fullpath, size, content_type, etag, mtime):
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and _if_range_matches(
+            request, etag, mtime):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except ValueError:
+            response = HttpResponse(
+                status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(fullpath, 'rb')
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type)
+    start, end = byte_range
+    response = FileResponse(
+        RangeFile(file, start, end),
+        content_type=content_type,
+        status=HTTPStatus.PARTIAL_CONTENT,
+    )
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Отдаёт файл из MEDIA_ROOT с поддержкой Range и условных запросов.
+
+    Целиком файл отдаёт FileResponse: WSGI-сервер с wsgi.file_wrapper
+    пошлёт его через sendfile. С MEDIA_SENDFILE_HEADER отдачу берёт на
+    себя прокси (nginx — X-Accel-Redirect, Apache/lighttpd — X-Sendfile).
+    """
+    fullpath, stat_result = _stat(path)
+    mtime = stat_result.st_mtime
+    etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(mtime))
+    if response is None:
+        content_type = (
+            mimetypes.guess_type(fullpath)[0] or 'application/octet-stream')
+        if settings.MEDIA_SENDFILE_HEADER:
+            response = _offload(fullpath, path, content_type)
+        else:
+            response = _file_response(
+                request, fullpath, stat_result.st_size, content_type,
+                etag, mtime)
+    return _headers(response, path, etag, mtime)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def test_overrides():
+    """Настройки, которые тесты подменяют поверх yatube.settings.
+
+    Тесты не должны видеть кэш, оставшийся от запущенного сайта,
+    и фоновые потоки, пишущие во временный MEDIA_ROOT после теста.
+    """
+    caches = {
+        alias: dict(config) for alias, config in settings.CACHES.items()}
+    caches['default']['LOCATION'] = (
+        'file:yatube-test-cache?mode=memory&cache=shared')
+    return {
+        'CACHES': caches,
+        'THUMBNAIL_WORKERS': 0,
+        'PURGE_WORKERS': 0,
+        'FEED_WORKERS': 0,
+    }
+
+
+class TestRunner(DiscoverRunner):
+    """manage.py test с настройками из test_overrides."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.overridden = override_settings(**test_overrides())
+        self.overridden.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        from posts.caching import flush_page_stats
+
+        # Иначе atexit допишет счётчики уже в настоящий кэш.
+        flush_page_stats()
+        self.overridden.disable()
+        super().teardown_test_environment(**kwargs)
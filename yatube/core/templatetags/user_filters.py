@@ -7,3 +7,39 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.simple_tag(takes_context=True)
+def url_replace(context, **params):
+    query = context['request'].GET.copy()
+    query.pop('page', None)
+    for key, value in params.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
+
+
+@register.simple_tag
+def pagination_window(page_obj):
+    """Номера страниц вокруг текущей: первая, предыдущая и следующая.
+
+    Все ссылки, кроме первой, идут по курсору: номер страницы (?page=N)
+    читался бы через OFFSET. Число страниц без COUNT неизвестно, поэтому
+    после следующей страницы — многоточие, если за ней могут быть ещё.
+    """
+    number = page_obj.number
+    window = []
+    if number > 1:
+        window.append({'number': 1})
+    if number > 3:
+        window.append({'number': None})
+    if number > 2:
+        window.append(
+            {'number': number - 1, 'cursor': page_obj.previous_cursor})
+    window.append({'number': number, 'current': True})
+    if page_obj.has_next():
+        window.append({'number': number + 1, 'cursor': page_obj.next_cursor})
+        window.append({'number': None})
+    return window
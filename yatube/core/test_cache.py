@@ -0,0 +1,93 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.test import SimpleTestCase
+
+from .cache import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_get_set_and_expiry(self):
+        """Значения читаются, а просроченные пропадают"""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.cache.set('short', 1, timeout=0)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.incr('short', 3), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_many_and_stats(self):
+        """get_many и set_many работают пачкой и считают попадания"""
+        self.cache.set_many({'a': 1, 'b': 2}, DEFAULT_TIMEOUT)
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 2)
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи"""
+        cache = self.make_cache(
+            MAX_ENTRIES=3, CULL_FREQUENCY=3, ACCESS_RESOLUTION=0)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(sorted(cache.get_many(['a', 'b', 'c', 'd'])),
+                         ['a', 'd'])
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_locked_database_does_not_raise(self):
+        """Пока базу держит другой писатель, чтение работает, а запись
+        пропускается без ошибки"""
+        cache = self.make_cache(CONNECT_TIMEOUT=0.05)
+        cache.set('key', 1)
+        writer = sqlite3.connect(self.location, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            self.assertEqual(cache.get('key'), 1)
+            cache.set('key', 2)
+            self.assertFalse(cache.add('other', 1))
+            with self.assertRaises(ValueError):
+                cache.incr('key')
+            self.assertEqual(cache.set_many({'other': 1}), ['other'])
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        self.assertEqual(cache.get('key'), 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна через общий файл"""
+        script = (
+            'import sys; sys.path.insert(0, sys.argv[2]);'
+            'from django.conf import settings; settings.configure();'
+            'from core.cache import SQLiteCache;'
+            "SQLiteCache(sys.argv[1], {}).set('shared', 42)"
+        )
+        project = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run(
+            [sys.executable, '-c', script, self.location, project],
+            check=True,
+        )
+        self.assertEqual(self.cache.get('shared'), 42)
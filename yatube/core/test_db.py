@@ -0,0 +1,38 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from .db import apply_pragmas
+
+
+class SQLitePragmasTest(TestCase):
+    def test_pragmas_applied(self):
+        """Каждое соединение получает настройки из SQLITE_PRAGMAS"""
+        with connection.cursor() as cursor:
+            # mmap_size у базы в памяти, как в тестах, не читается.
+            for name in ('busy_timeout', 'cache_size'):
+                with self.subTest(name=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(
+                        cursor.fetchone()[0], settings.SQLITE_PRAGMAS[name])
+
+    def test_invalid_pragma(self):
+        """Значения с SQL не выполняются"""
+        with connection.cursor() as cursor:
+            with self.assertRaises(ValueError):
+                apply_pragmas(cursor, {'cache_size': '1; DROP TABLE x'})
+
+
+class BenchmarkTest(SimpleTestCase):
+    def test_benchmark_command(self):
+        """Бенчмарк печатает результат для обоих профилей"""
+        output = StringIO()
+        call_command(
+            'benchmark_sqlite', '--seconds', '0.1', '--threads', '2',
+            '--rows', '100', stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('SQLITE_PRAGMAS: чтений'))
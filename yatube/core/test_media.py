@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.test import SimpleTestCase, override_settings
+
+CONTENT = b'0123456789'
+HASHED = 'posts/ab/cd/abcd' + '0' * 60 + '.gif'
+
+
+class MediaServeTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name in ('posts/plain.txt', HASHED):
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+        settings = override_settings(MEDIA_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get('/media/' + name, **headers)
+
+    def body(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_full_file(self):
+        """Файл отдаётся целиком с ETag и коротким кэшированием"""
+        response = self.get('posts/plain.txt')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertTrue(response['ETag'])
+        hashed = self.get(HASHED)
+        self.body(hashed)
+        self.assertIn('immutable', hashed['Cache-Control'])
+
+    def test_ranges(self):
+        """Range отдаёт часть файла, невыполнимый — 416"""
+        response = self.get('posts/plain.txt', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(self.body(response), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        response = self.get('posts/plain.txt', HTTP_RANGE='bytes=-3')
+        self.assertEqual(self.body(response), b'789')
+        response = self.get('posts/plain.txt', HTTP_RANGE='bytes=20-')
+        self.assertEqual(
+            response.status_code,
+            HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.get(
+            'posts/plain.txt', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_conditional(self):
+        """Совпавший ETag даёт 304 без тела"""
+        response = self.get('posts/plain.txt')
+        self.body(response)
+        response = self.get(
+            'posts/plain.txt', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_outside_media_root(self):
+        """Файлы вне MEDIA_ROOT и каталоги не отдаются"""
+        for name in ('../etc/passwd', 'posts/', 'posts/missing.gif'):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.get(name).status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_accel_redirect(self):
+        """С X-Accel-Redirect файл отдаёт прокси"""
+        response = self.get(HASHED)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/' + HASHED)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response.content, b'')
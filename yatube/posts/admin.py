@@ -1,6 +1,32 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models.expressions import RawSQL
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
+from django.utils import timezone
 
-from .models import Group, Post
+from . import purge, search, transfer
+from .models import Group, Post, PurgeJob
+
+
+class PurgeAdminMixin:
+    """Удаление через фоновое задание purge и сводка вместо дерева
+    связанных объектов на странице подтверждения.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        deleted_objects, model_count = purge.summary(objs)
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(self.opts.verbose_name)
+        return deleted_objects, model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        purge.schedule(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            purge.schedule(obj)
 
 
 @admin.register(Post)
@@ -15,13 +41,78 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not search.is_supported():
+            return super().get_search_results(
+                request, queryset, search_term)
+        sql, params = search.matching_ids(search_term)
+        return queryset.filter(id__in=RawSQL(sql, params)), False
+
+    def get_urls(self):
+        return [
+            path(
+                'export/',
+                self.admin_site.admin_view(self.export_view),
+                name='posts_post_export',
+            ),
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        """Выгрузка NDJSON для import_yatube: ?since=<дата>&gzip=1."""
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        since = request.GET.get('since')
+        if since:
+            try:
+                since = transfer.parse_since(since)
+            except ValueError as error:
+                return HttpResponseBadRequest(str(error))
+        compress = request.GET.get('gzip') == '1'
+        response = StreamingHttpResponse(
+            transfer.encode(transfer.export_records(since or None), compress),
+            content_type=(
+                'application/gzip' if compress else 'application/x-ndjson'),
+        )
+        filename = f'yatube-{timezone.now():%Y%m%d%H%M%S}.ndjson'
+        if compress:
+            filename += '.gz'
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
 
 @admin.register(Group)
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(PurgeAdminMixin, admin.ModelAdmin):
     list_display = ('pk',
                     'title',
                     'slug',
                     'description')
     search_fields = ('title',)
     list_editable = ('description',)
+    list_filter = ('is_active',)
     empty_value_display = '-пусто-'
+
+
+@admin.register(PurgeJob)
+class PurgeJobAdmin(admin.ModelAdmin):
+    list_display = ('label', 'kind', 'state', 'progress', 'created',
+                    'updated_at')
+    list_filter = ('state', 'kind')
+    readonly_fields = ('kind', 'object_id', 'label', 'state', 'total',
+                       'done', 'error', 'created', 'updated_at')
+    actions = ('resume',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress(self, job):
+        if not job.total:
+            return '-'
+        return f'{job.done} из {job.total} ({job.done * 100 // job.total}%)'
+    progress.short_description = 'Прогресс'
+
+    def resume(self, request, queryset):
+        # Выполняющееся задание уже работает в своём потоке.
+        for job in queryset.exclude(
+                state__in=(PurgeJob.DONE, PurgeJob.RUNNING)):
+            purge.start(job)
+    resume.short_description = 'Продолжить удаление'
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.core.checks import Tags, register
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import checks, signals
+
+        post_migrate.connect(signals.create_search_triggers, sender=self)
+        register(checks.search_triggers_check, Tags.database)
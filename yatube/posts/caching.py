@@ -0,0 +1,315 @@
+import atexit
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+
+from .utils import (
+    POSTS_ON_PAGE, POSTS_ORDERING, KeysetPaginator, page_snapshot
+)
+
+GENERATION_KEY = 'posts:generation:{}'
+MODIFIED_KEY = 'posts:modified:{}'
+PAGE_KEY = 'posts:page:{}:{}'
+LEASE_KEY = 'posts:lease:{}:{}'
+PAGE_STATS_KEY = 'posts:page-stats:{}:{}'
+WRITTEN_SESSION_KEY = 'posts:written:{}'
+INDEX = 'index'
+# Имена авторов комментариев на страницах постов: правка профиля
+# сбрасывает одно поколение, а не по одному на каждый пост.
+USERS = 'users'
+HIT = 'hit'
+MISS = 'miss'
+STALE = 'stale'
+BYPASS = 'bypass'
+EVENTS = (HIT, MISS, STALE, BYPASS)
+EARLY_REFRESH_BETA = 1.0
+STATS_FLUSH_INTERVAL = 10
+GROUP = 'group:{}'
+AUTHOR = 'author:{}'
+POST = 'post:{}'
+STATS = 'stats:{}'
+FOLLOWS = 'follows:{}'
+
+
+_pending_stats = Counter()
+_pending_stats_since = time.monotonic()
+_pending_lock = threading.Lock()
+
+
+def _initial_generation():
+    # Поколение растёт и после вытеснения ключа из кэша, поэтому
+    # старые страницы с прежним номером никогда не оживут.
+    return time.time_ns() // 1000
+
+
+def generation(scope):
+    key = GENERATION_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial_generation(), None)
+        value = cache.get(key, _initial_generation())
+    return value
+
+
+def bump_generation(scope):
+    key = GENERATION_KEY.format(scope)
+    cache.set(MODIFIED_KEY.format(scope), time.time(), None)
+    cache.add(key, _initial_generation(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        value = _initial_generation()
+        cache.set(key, value, None)
+        return value
+
+
+def bump_generations(*scopes):
+    for scope in scopes:
+        bump_generation(scope)
+
+
+def bump_on_commit(*scopes):
+    """Сбрасывает поколения после коммита текущей транзакции.
+
+    Сброс внутри транзакции даёт параллельному запросу прочитать ещё
+    старые строки и закэшировать их уже под новым поколением.
+    """
+    transaction.on_commit(lambda: bump_generations(*scopes))
+
+
+def group_scope(group_id):
+    return GROUP.format(group_id)
+
+
+def author_scope(author_id):
+    return AUTHOR.format(author_id)
+
+
+def post_scope(post_id):
+    return POST.format(post_id)
+
+
+def stats_scope(user_id):
+    return STATS.format(user_id)
+
+
+def follows_scope(user_id):
+    return FOLLOWS.format(user_id)
+
+
+def post_scopes(post):
+    """Ленты, на которых виден пост."""
+    scopes = [INDEX, author_scope(post.author_id), post_scope(post.pk)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def remember_write(request, *scopes):
+    """Запоминает в сессии поколения, в которых автор увидит свою запись.
+
+    Поколение сбрасывается на коммите (bump_on_commit), поэтому читается
+    тоже после коммита: вне транзакции колбэк выполнится сразу.
+    """
+    def remember():
+        for scope in scopes:
+            request.session[WRITTEN_SESSION_KEY.format(scope)] = generation(
+                scope)
+    transaction.on_commit(remember)
+
+
+def _behind_write(session, scope, current):
+    """Отстаёт ли поколение от записи автора; догнавшее забывается."""
+    key = WRITTEN_SESSION_KEY.format(scope)
+    written = session.get(key)
+    if written is None:
+        return False
+    if written > current:
+        return True
+    del session[key]
+    return False
+
+
+def _count(view, event):
+    """Счётчики копятся в процессе: общий ключ на каждый запрос стал бы
+    самой горячей записью кэша.
+    """
+    with _pending_lock:
+        _pending_stats[view, event] += 1
+        due = time.monotonic() - _pending_stats_since >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_page_stats()
+
+
+def flush_page_stats():
+    """Переносит накопленные в процессе счётчики страниц в кэш."""
+    global _pending_stats_since
+    with _pending_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+        _pending_stats_since = time.monotonic()
+    for (view, event), count in pending.items():
+        key = PAGE_STATS_KEY.format(view, event)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+
+atexit.register(flush_page_stats)
+
+
+def page_stats(view):
+    """Сколько раз view отдал страницу из кэша, устаревшую или из БД.
+
+    Учитываются счётчики, уже сброшенные процессами в кэш.
+    """
+    flush_page_stats()
+    keys = {PAGE_STATS_KEY.format(view, event): event for event in EVENTS}
+    counts = cache.get_many(list(keys))
+    return {event: counts.get(key, 0) for key, event in keys.items()}
+
+
+def _is_fresh(entry, current):
+    """Свежая ли запись; чем ближе срок, тем чаще её обновляют заранее.
+
+    Вероятностное раннее обновление (XFetch): запрос обновляет запись
+    раньше срока с вероятностью, растущей с её возрастом и временем
+    пересчёта, поэтому истечение не совпадает у всех воркеров сразу.
+    """
+    if entry['generation'] != current:
+        return False
+    early = entry['delta'] * EARLY_REFRESH_BETA * -math.log(
+        1 - random.random())
+    return time.time() + early < entry['expires']
+
+
+def cached_page(request, scope, post_list, ordering=POSTS_ORDERING):
+    """Страница ленты из общего для всех пользователей кэша.
+
+    Запись хранит поколение scope, при котором её собрали. Устаревшую
+    запись пересчитывает один запрос, взявший аренду; остальные, пока
+    он работает, получают старую копию (stale-while-revalidate).
+    """
+    paginator = KeysetPaginator(post_list, POSTS_ON_PAGE, ordering)
+    cursor = request.GET.get('cursor')
+    number = request.GET.get('page')
+    current = generation(scope)
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else scope
+    session = getattr(request, 'session', {})
+    if _behind_write(session, scope, current):
+        # Этот процесс ещё не видит поколение с записью автора:
+        # читаем из БД и не трогаем общий кэш.
+        _count(view, BYPASS)
+        return paginator.get_page(cursor, number)
+    params = hashlib.md5(f'{cursor}|{number}'.encode()).hexdigest()
+    key = PAGE_KEY.format(scope, params)
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, current):
+        _count(view, HIT)
+        return paginator.restore(entry['snapshot'])
+    lease = LEASE_KEY.format(scope, params)
+    leased = cache.add(lease, True, settings.POSTS_PAGE_LEASE_TIMEOUT)
+    if not leased and entry is not None:
+        _count(view, STALE)
+        request.served_stale = True
+        return paginator.restore(entry['snapshot'])
+    _count(view, MISS)
+    if not leased:
+        # Отдать нечего, а страницу уже собирает другой запрос.
+        return paginator.get_page(cursor, number)
+    try:
+        started = time.time()
+        page = paginator.get_page(cursor, number)
+        timeout = settings.POSTS_PAGE_CACHE_TIMEOUT
+        cache.set(key, {
+            'generation': current,
+            'snapshot': page_snapshot(page),
+            'expires': time.time() + timeout,
+            'delta': time.time() - started,
+        }, timeout + settings.POSTS_PAGE_STALE_TIMEOUT)
+    finally:
+        cache.delete(lease)
+    return page
+
+
+def validators(request, scopes):
+    """ETag и Last-Modified страницы, собранной из scopes.
+
+    Читает только кэш: поколения и время изменения всех scopes
+    достаются одним get_many.
+    """
+    keys = {GENERATION_KEY.format(scope): scope for scope in scopes}
+    modified_keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    values = cache.get_many(list(keys) + modified_keys)
+    generations = [
+        values[key] if key in values else generation(scope)
+        for key, scope in keys.items()
+    ]
+    etag = hashlib.md5('|'.join(
+        [str(request.user.pk or ''), request.get_full_path()]
+        + [str(value) for value in generations]
+    ).encode()).hexdigest()
+    modified = []
+    for key in modified_keys:
+        if key not in values:
+            # Время изменения неизвестно: честнее считать, что это сейчас.
+            values[key] = time.time()
+            cache.add(key, values[key], None)
+        modified.append(values[key])
+    last_modified = max(modified)
+    if time.time() - last_modified < 1:
+        # Last-Modified точен до секунды: вторая правка в ту же секунду
+        # осталась бы незамеченной, поэтому клиент сверяет только ETag.
+        return etag, None
+    return etag, datetime.fromtimestamp(last_modified, timezone.utc)
+
+
+def conditional(get_scopes):
+    """Отвечает 304 раньше, чем view запросит ленту и отрендерит шаблон.
+
+    get_scopes(request, *args, **kwargs) возвращает scopes страницы
+    или None, если страницы нет.
+    """
+    def page_validators(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            scopes = get_scopes(request, *args, **kwargs)
+            request._page_validators = (
+                (None, None) if scopes is None
+                else validators(request, scopes)
+            )
+        return request._page_validators
+
+    conditional_view = condition(
+        etag_func=lambda *args, **kwargs: page_validators(
+            *args, **kwargs)[0],
+        last_modified_func=lambda *args, **kwargs: page_validators(
+            *args, **kwargs)[1],
+    )
+
+    def decorator(view):
+        view = conditional_view(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if getattr(request, 'served_stale', False):
+                # Валидаторы описывают текущее поколение, а копия старая:
+                # с ними клиент закэшировал бы её до следующей правки.
+                del response['ETag']
+                del response['Last-Modified']
+            return response
+        return wrapper
+    return decorator
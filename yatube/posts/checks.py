@@ -0,0 +1,24 @@
+from django.core.checks import Warning
+from django.db import DatabaseError
+
+from .models import ImportCheckpoint
+
+
+def search_triggers_check(app_configs, **kwargs):
+    """Предупреждает о триггерах поиска, снятых убитым импортом."""
+    try:
+        sources = list(ImportCheckpoint.objects.filter(
+            triggers_dropped=True).values_list('source', flat=True))
+    except DatabaseError:
+        # Таблицы ещё нет: migrate не применён.
+        return []
+    if not sources:
+        return []
+    sources = ', '.join(sources)
+    return [Warning(
+        f'Импорт {sources} прерван со снятыми триггерами поиска: новые '
+        'посты не попадают в индекс',
+        hint='Если импорт сейчас не идёт, запустите rebuild_search_index '
+             'или продолжите импорт',
+        id='posts.W001',
+    )]
@@ -0,0 +1,95 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from . import caching
+from .models import Comment, Follow, Post, User, UserStats
+
+REPAIR_BATCH_SIZE = 500
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def change_user_stats(user_id, **deltas):
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+    caching.bump_on_commit(caching.stats_scope(user_id))
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+    caching.bump_on_commit(caching.post_scope(post_id))
+
+
+def _actual(model, field, outer='pk'):
+    counted = model.objects.filter(**{field: OuterRef(outer)}).order_by()
+    return Coalesce(
+        Subquery(counted.values(field).annotate(
+            total=Count('pk')).values('total')),
+        0,
+    )
+
+
+def _repair(queryset, counters, outer, scope, dry_run, batch_size):
+    """Чинит разошедшиеся строки пачками по pk и сбрасывает их scope.
+
+    После импорта расходятся почти все строки: список всех id не влез
+    бы в лимит параметров SQLite.
+    """
+    actual = {
+        f'actual_{field}': _actual(model, lookup, outer)
+        for field, (model, lookup) in counters.items()
+    }
+    in_sync = Q()
+    for field in counters:
+        in_sync &= Q(**{field: F(f'actual_{field}')})
+    drifted = queryset.annotate(**actual).exclude(in_sync).order_by('pk')
+    total = 0
+    last_id = None
+    while True:
+        batch = drifted if last_id is None else drifted.filter(
+            pk__gt=last_id)
+        ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        last_id = ids[-1]
+        total += len(ids)
+        if dry_run:
+            continue
+        queryset.filter(pk__in=ids).update(**{
+            field: _actual(model, lookup, outer)
+            for field, (model, lookup) in counters.items()
+        })
+        caching.bump_generations(*(scope(pk) for pk in ids))
+
+
+def repair_counters(dry_run=False, batch_size=REPAIR_BATCH_SIZE):
+    """Сверяет счётчики с таблицами и чинит разошедшиеся.
+
+    Возвращает число созданных и исправленных строк.
+    """
+    missing = User.objects.filter(stats__isnull=True)
+    created = missing.count()
+    if created and not dry_run:
+        UserStats.objects.bulk_create(
+            (UserStats(user_id=user_id)
+             for user_id in missing.values_list('pk', flat=True)),
+            batch_size=500,
+        )
+    users = _repair(
+        UserStats.objects.all(), USER_COUNTERS, 'user_id',
+        caching.stats_scope, dry_run, batch_size)
+    posts = _repair(
+        Post.objects.all(),
+        {'comments_count': (Comment, 'post')},
+        'pk',
+        caching.post_scope,
+        dry_run,
+        batch_size,
+    )
+    return {'created': created, 'users': users, 'posts': posts}
@@ -0,0 +1,277 @@
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import POSTS_ORDERING, batches, keyset_queryset, seek_queryset
+
+FANOUT_BATCH_SIZE = 500
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+HEAVY_AUTHORS_CACHE_KEY = 'posts:feeds:heavy_authors'
+HEAVY_AUTHORS_TIMEOUT = 300
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_WORKERS,
+            thread_name_prefix='feeds',
+        )
+    return _executor
+
+
+def _insert_entries(entries, batch_size=FANOUT_BATCH_SIZE):
+    for batch in batches(entries, batch_size):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def heavy_authors():
+    """Авторы, чьи посты не раскладываются по лентам, а читаются при показе.
+
+    Это авторы с числом подписчиков больше FEED_FANOUT_THRESHOLD и те,
+    чьи посты хоть раз не были разложены (UserStats.pulled): их читают,
+    пока catch_up не дозаполнит ленты.
+    """
+    authors = cache.get(HEAVY_AUTHORS_CACHE_KEY)
+    if authors is None:
+        authors = frozenset(
+            UserStats.objects.filter(
+                Q(followers_count__gt=settings.FEED_FANOUT_THRESHOLD)
+                | Q(pulled=True)
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(HEAVY_AUTHORS_CACHE_KEY, authors, HEAVY_AUTHORS_TIMEOUT)
+    return authors
+
+
+def is_pushed(author_id):
+    return author_id not in heavy_authors()
+
+
+def _mark_pulled(author_id):
+    if UserStats.objects.filter(
+            user_id=author_id, pulled=False).update(pulled=True):
+        cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_pushed(post.author_id):
+        _mark_pulled(post.author_id)
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _insert_entries(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def _backfill(user_id, posts, batch_size):
+    _insert_entries(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts.values_list(
+             'id', 'pub_date').iterator()),
+        batch_size,
+    )
+
+
+def backfill(follow, batch_size=FANOUT_BATCH_SIZE):
+    if not is_pushed(follow.author_id):
+        _mark_pulled(follow.author_id)
+        return
+    _backfill(
+        follow.user_id, Post.objects.filter(author_id=follow.author_id),
+        batch_size)
+
+
+def _followers_after(author_id, last_follow, limit=None):
+    follows = Follow.objects.filter(
+        author_id=author_id, pk__gt=last_follow).order_by('pk')
+    return list(follows.values_list('pk', 'user_id')[:limit])
+
+
+def catch_up(author_id, batch_size=FANOUT_BATCH_SIZE):
+    """Дозаполняет ленты подписчиков автора, опустившегося до порога.
+
+    Пока стоит отметка pulled, посты автора дочитываются при показе,
+    поэтому ленты заполняются короткими транзакциями по одному
+    подписчику и недозаполненными не видны. Подписки и посты,
+    появившиеся за это время, добираются в последней транзакции вместе
+    со снятием отметки.
+    """
+    stats = UserStats.objects.filter(
+        user_id=author_id,
+        pulled=True,
+        followers_count__lte=settings.FEED_FANOUT_THRESHOLD,
+    )
+    if not stats.exists():
+        return False
+    posts = Post.objects.filter(author_id=author_id)
+    last_post = posts.aggregate(last=Max('id'))['last'] or 0
+    last_follow = 0
+    while True:
+        followers = _followers_after(author_id, last_follow, batch_size)
+        if not followers:
+            break
+        for last_follow, user_id in followers:
+            with transaction.atomic():
+                _backfill(user_id, posts.filter(id__lte=last_post),
+                          batch_size)
+    with transaction.atomic():
+        # Первая запись берёт блокировку: новых подписок и постов, пока
+        # она не снята, не появится. Автор мог снова стать тяжёлым.
+        if not stats.update(pulled=False):
+            return False
+        for _, user_id in _followers_after(author_id, last_follow):
+            _backfill(user_id, posts, batch_size)
+        fresh = posts.filter(id__gt=last_post)
+        if fresh.exists():
+            for _, user_id in _followers_after(author_id, 0):
+                _backfill(user_id, fresh, batch_size)
+    cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+    return True
+
+
+def _catch_up_in_worker(author_id):
+    try:
+        catch_up(author_id)
+    except Exception:
+        logger.exception('Не удалось дозаполнить ленты автора %s', author_id)
+    finally:
+        # У потока своё соединение с БД, его никто больше не закроет.
+        connection.close()
+
+
+def schedule_catch_up(author_id):
+    """Запускает catch_up в фоновом потоке после коммита: в запросе
+    отписки дозаполнение держало бы блокировку записи SQLite.
+    """
+    if not settings.FEED_WORKERS:
+        transaction.on_commit(lambda: catch_up(author_id))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_catch_up_in_worker, author_id))
+
+
+def prune(follow):
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id,
+    ).delete()
+
+
+def rebuild_timelines(batch_size=FANOUT_BATCH_SIZE):
+    heavy = Q(followers_count__gt=settings.FEED_FANOUT_THRESHOLD)
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        UserStats.objects.filter(heavy).update(pulled=True)
+        UserStats.objects.exclude(heavy).update(pulled=False)
+        cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+        for follow in Follow.objects.order_by('pk').iterator():
+            backfill(follow, batch_size)
+    return TimelineEntry.objects.count()
+
+
+class TimelineFeed:
+    """Лента подписок, читаемая из материализованной таблицы.
+
+    Отдаёт посты по ключу (pub_date, id) для KeysetPaginator,
+    а сама страница читается одним проходом по индексу ленты.
+    """
+    model = Post
+
+    def __init__(self, user):
+        self.entries = TimelineEntry.objects.filter(
+            user=user, post__author__is_active=True,
+        ).select_related('post__author', 'post__group')
+
+    def seek(self, key, reverse, limit):
+        entries = seek_queryset(
+            self.entries, TIMELINE_ORDERING, key, reverse, limit)
+        return [entry.post for entry in entries]
+
+    def slice(self, offset, limit):
+        ordered = self.entries.order_by(*TIMELINE_ORDERING)
+        return [entry.post for entry in ordered[offset:offset + limit]]
+
+
+def _post_key(post):
+    return post.pub_date, post.id
+
+
+def _merge(sources, reverse, limit):
+    seen = set()
+    merged = []
+    for post in heapq.merge(*sources, key=_post_key, reverse=not reverse):
+        if post.id in seen:
+            continue
+        seen.add(post.id)
+        merged.append(post)
+        if len(merged) == limit:
+            break
+    return merged
+
+
+class FollowFeed:
+    """Гибридная лента подписок.
+
+    Посты обычных авторов заранее разложены по TimelineEntry, посты
+    авторов с большим числом подписчиков дочитываются при показе,
+    и обе части сливаются в одну страницу по (pub_date, id).
+    """
+    model = Post
+
+    def __init__(self, user):
+        self.timeline = TimelineFeed(user)
+        self.pulled = None
+        authors = heavy_authors()
+        if authors:
+            followed = list(Follow.objects.filter(
+                user=user, author_id__in=authors
+            ).values_list('author_id', flat=True))
+            if followed:
+                self.pulled = Post.objects.for_feed().filter(
+                    author_id__in=followed)
+
+    def _window(self, posts, timeline, limit, reverse=False):
+        """Дочитываемые посты не дальше последнего поста ленты.
+
+        Если страница ленты заполнена, более далёкие посты на неё не
+        попадут, и сортировка IN-запроса идёт только по окну страницы.
+        """
+        if len(timeline) < limit:
+            return posts
+        bound = 'lte' if reverse else 'gte'
+        return posts.filter(**{f'pub_date__{bound}': timeline[-1].pub_date})
+
+    def seek(self, key, reverse, limit):
+        timeline = self.timeline.seek(key, reverse, limit)
+        if self.pulled is None:
+            return timeline
+        pulled = self._window(
+            keyset_queryset(self.pulled, POSTS_ORDERING, key, reverse),
+            timeline, limit, reverse)
+        return _merge([timeline, list(pulled[:limit])], reverse, limit)
+
+    def slice(self, offset, limit):
+        if self.pulled is None:
+            return self.timeline.slice(offset, limit)
+        # Слить две части можно только с начала ленты; глубину
+        # ограничивает MAX_LEGACY_PAGE.
+        timeline = self.timeline.slice(0, offset + limit)
+        pulled = self._window(
+            self.pulled.order_by(*POSTS_ORDERING), timeline, offset + limit)
+        return _merge(
+            [timeline, list(pulled[:offset + limit])], False,
+            offset + limit)[offset:]
@@ -1,6 +1,7 @@
 from django import forms
+from django.db.models import Q
 
-from .models import Post, Comment
+from .models import Group, Post, Comment
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +9,12 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Группу, которую сейчас удаляют, пост сохраняет до конца удаления.
+        self.fields['group'].queryset = Group.objects.filter(
+            Q(is_active=True) | Q(pk=self.instance.group_id))
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,55 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import thumbnails, variants
+
+ARTICLE_TEMPLATE = 'includes/post_article.html'
+ARTICLE_KEY = 'posts:article:{}:{:%Y%m%d%H%M%S%f}:{}'
+
+
+def article_key(post):
+    """Ключ HTML-фрагмента поста.
+
+    updated_at меняется при правке поста; имя автора и группа выводятся
+    во фрагменте, но живут в других таблицах, поэтому входят в ключ хешем.
+    Удаляемая группа во фрагменте не выводится.
+    """
+    group = post.group
+    if group is not None and not group.is_active:
+        group = None
+    related = '|'.join((
+        post.author.username,
+        post.author.get_full_name(),
+        group.title if group else '',
+        group.slug if group else '',
+    ))
+    return ARTICLE_KEY.format(
+        post.id,
+        post.updated_at,
+        hashlib.md5(related.encode()).hexdigest(),
+    )
+
+
+def render_articles(posts):
+    """HTML постов ленты: всё, что есть в кэше, читается одним get_many,
+    шаблон рендерится только для промахов.
+    """
+    keys = [article_key(post) for post in posts]
+    articles = cache.get_many(keys)
+    to_render = [
+        (key, post) for key, post in zip(keys, posts) if key not in articles
+    ]
+    posts_to_render = [post for key, post in to_render]
+    variants.prefetch(posts_to_render)
+    thumbnails.prefetch(posts_to_render)
+    missed = {
+        key: render_to_string(ARTICLE_TEMPLATE, {'post': post})
+        for key, post in to_render
+    }
+    if missed:
+        cache.set_many(missed, settings.POSTS_ARTICLE_CACHE_TIMEOUT)
+        articles.update(missed)
+    return [articles[key] for key in keys]
@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.feeds import TIMELINE_ORDERING
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.utils import COMMENTS_ORDERING, POSTS_ORDERING, keyset_queryset
+
+
+def view_queries(key=None):
+    """Запросы, которые views выполняют для одной страницы,
+    и индексы, по которым они должны идти.
+    """
+    feed = Post.objects.for_feed()
+    timeline = TimelineEntry.objects.filter(
+        user_id=0, post__author__is_active=True,
+    ).select_related('post__author', 'post__group')
+    queries = {
+        'index': (
+            keyset_queryset(feed, POSTS_ORDERING, key), 'post_feed_idx'),
+        'group_list': (
+            keyset_queryset(feed.filter(group_id=0), POSTS_ORDERING, key),
+            'post_group_feed_idx',
+        ),
+        'profile': (
+            keyset_queryset(feed.filter(author_id=0), POSTS_ORDERING, key),
+            'post_author_feed_idx',
+        ),
+        'follow_index': (
+            keyset_queryset(timeline, TIMELINE_ORDERING, key),
+            'timeline_user_feed_idx',
+        ),
+        'follow_index pulled': (
+            keyset_queryset(
+                feed.filter(author_id__in=[0, 1]), POSTS_ORDERING, key),
+            'post_author_feed_idx',
+        ),
+        'post_detail comments': (
+            keyset_queryset(
+                Comment.objects.for_feed().filter(post_id=0),
+                COMMENTS_ORDERING,
+                key,
+            ),
+            'comment_post_feed_idx',
+        ),
+    }
+    if key is None:
+        queries['fan-out followers'] = (
+            Follow.objects.filter(author_id=0).values_list('user_id'),
+            'follow_author_user_idx',
+        )
+    return queries
+
+
+# Посты тяжёлых авторов читаются одним IN-запросом в окне страницы
+# ленты (FollowFeed._window), поэтому сортируется лишь несколько строк.
+SORTED_IN_MEMORY = {'follow_index pulled'}
+
+
+def plan_problems(plan, index, sorted_in_memory=False):
+    problems = []
+    for line in plan.splitlines():
+        detail = line.split(maxsplit=3)[-1] if line[:1].isdigit() else line
+        detail = detail.strip(' |-`')
+        if 'TEMP B-TREE' in detail:
+            if not sorted_in_memory:
+                problems.append(detail)
+        elif detail.startswith('SCAN') and 'USING' not in detail:
+            problems.append(detail)
+    if f'INDEX {index}' not in plan:
+        problems.append(f'не используется {index}')
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет через EXPLAIN QUERY PLAN, что запросы лент идут по '
+        'индексам без полного сканирования и временной сортировки'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка планов поддерживает только SQLite')
+        failed = []
+        for key in (None, (timezone.now(), 0)):
+            for name, (queryset, index) in view_queries(key).items():
+                label = name if key is None else f'{name} (курсор)'
+                problems = plan_problems(
+                    queryset.explain(), index, name in SORTED_IN_MEMORY)
+                if problems:
+                    failed.append(label)
+                    self.stdout.write(self.style.ERROR(
+                        f'{label}: ' + '; '.join(problems)))
+                else:
+                    self.stdout.write(f'{label}: OK, {index}')
+        if failed:
+            raise CommandError(
+                'Запросы без подходящего индекса: ' + ', '.join(failed))
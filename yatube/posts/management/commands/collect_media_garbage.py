@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки, миниатюры и варианты, на которые нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, что можно удалить',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=None,
+            help='Не больше стольких удалений в секунду',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=media.GC_MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=media.GC_BATCH_SIZE,
+            help='Сколько файлов сверять с БД одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        result = media.collect_garbage(
+            dry_run=options['dry_run'],
+            rate=options['rate'],
+            min_age=options['min_age'],
+            batch_size=options['batch_size'],
+        )
+        for kind, (files, size) in result.items():
+            self.stdout.write(f'{kind}: файлов {files}, байт {size}')
+        total = sum(size for files, size in result.values())
+        verb = 'Можно освободить' if options['dry_run'] else 'Освобождено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} байт: {total}'))
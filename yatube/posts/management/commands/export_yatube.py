@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в NDJSON потоком, не загружая таблицы в память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, - для stdout',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжать выгрузку; включается сама для файлов .gz',
+        )
+        parser.add_argument(
+            '--since',
+            help='Выгрузить только появившееся после даты ISO 8601',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=transfer.EXPORT_BATCH_SIZE,
+            help='Сколько строк читать одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = transfer.parse_since(options['since'])
+            except ValueError as error:
+                raise CommandError(error)
+        path = options['path']
+        compress = options['gzip'] or path.endswith('.gz')
+        chunks = transfer.encode(
+            transfer.export_records(since, options['batch_size']), compress)
+        if path == '-':
+            for data in chunks:
+                sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+            return
+        with open(path, 'wb') as file:
+            for data in chunks:
+                file.write(data)
+        self.stdout.write(self.style.SUCCESS(f'Выгрузка записана в {path}'))
@@ -0,0 +1,106 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+NAMES_BATCH_SIZE = 1000
+
+
+def _init_worker():
+    django.setup()
+
+
+def _generate(name, force):
+    try:
+        thumbnails.generate(name, force)
+    except Exception as error:
+        return name, str(error)
+    return name, None
+
+
+def _generate_in_worker(name, force):
+    try:
+        return _generate(name, force)
+    finally:
+        connections.close_all()
+
+
+def _names(batch_size=NAMES_BATCH_SIZE):
+    """Разные имена картинок пачками по возрастанию имени.
+
+    После хранения по хешу один файл бывает у многих постов:
+    параллельные процессы создавали бы его варианты наперегонки.
+    """
+    last = ''
+    while True:
+        names = list(
+            Post.objects.filter(image__gt=last).order_by('image')
+            .values_list('image', flat=True).distinct()[:batch_size]
+        )
+        if not names:
+            return
+        last = names[-1]
+        yield names
+
+
+def _imap(pool, work, batches, window):
+    """Как pool.map, но держит в очереди не больше window задач:
+    имена читаются из БД по мере выполнения.
+    """
+    pending = deque()
+    for names in batches:
+        # Дочерние процессы не должны делить соединения родителя.
+        connections.close_all()
+        for name in names:
+            pending.append(pool.submit(work, name))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры и варианты картинок существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Сколько процессов создают миниатюры параллельно',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие миниатюры',
+        )
+
+    def _results(self, processes, force):
+        if processes <= 1:
+            for names in _names():
+                for name in names:
+                    yield _generate(name, force)
+            return
+        work = partial(_generate_in_worker, force=force)
+        with ProcessPoolExecutor(
+            processes, initializer=_init_worker
+        ) as pool:
+            yield from _imap(pool, work, _names(), processes * 16)
+
+    def handle(self, *args, **options):
+        done = 0
+        for name, error in self._results(
+                options['processes'], options['force']):
+            if error:
+                self.stderr.write(f'{name}: {error}')
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы для картинок: {done}'))
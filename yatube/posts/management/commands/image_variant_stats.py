@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from posts.models import ImageVariant
+from posts.variants import FALLBACK
+
+
+class Command(BaseCommand):
+    help = 'Показывает размеры вариантов картинок и экономию против JPEG'
+
+    def handle(self, *args, **options):
+        fallback = ImageVariant.objects.filter(
+            source=OuterRef('source'),
+            width=OuterRef('width'),
+            format=FALLBACK,
+        ).values('size')[:1]
+        rows = ImageVariant.objects.annotate(
+            fallback_size=Subquery(fallback),
+        ).values('format').annotate(
+            variants=Count('id'),
+            size=Sum('size'),
+            fallback_size=Sum('fallback_size'),
+        ).order_by('format')
+        for row in rows:
+            saved = (row['fallback_size'] or 0) - row['size']
+            self.stdout.write(
+                f'{row["format"]}: вариантов {row["variants"]}, '
+                f'байт {row["size"]}, сэкономлено против JPEG {saved}'
+            )
@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из NDJSON (можно .gz или - для stdin); прерванный импорт '
+        'продолжается с последней загруженной пачки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON')
+        parser.add_argument(
+            '--source',
+            help=(
+                'Имя контрольной точки, по умолчанию путь к файлу; '
+                'для stdin обязательно'
+            ),
+        )
+        parser.add_argument(
+            '--origin',
+            help=(
+                'Имя сайта-источника, если выгрузка без заголовка; '
+                'по нему узнаются уже загруженные посты'
+            ),
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=transfer.IMPORT_CHUNK_SIZE,
+            help='Сколько строк загружать в одной транзакции',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=transfer.IMPORT_BATCH_SIZE,
+            help='Сколько строк вставлять одним INSERT',
+        )
+
+    def progress(self, rows, seconds):
+        speed = rows / max(seconds, 1e-6)
+        self.stdout.write(
+            f'Загружено строк: {rows}, {speed:.0f} в секунду')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        source = options['source']
+        if source is None:
+            if path == '-':
+                raise CommandError(
+                    'Для чтения из stdin укажите --source: по нему '
+                    'продолжается прерванный импорт')
+            source = os.path.abspath(path)
+        with transfer.open_input(path) as lines:
+            checkpoint, rows, skipped = transfer.import_records(
+                lines,
+                source,
+                origin=options['origin'],
+                chunk_size=options['chunk_size'],
+                batch_size=options['batch_size'],
+                progress=self.progress,
+            )
+        if not rows and checkpoint.finished:
+            self.stdout.write(f'Импорт {source} уже завершён')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершён: строк {checkpoint.lines}, '
+            f'в этот запуск {rows}, пропущено записей {skipped}'))
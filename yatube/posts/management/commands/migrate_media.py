@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = 'Переносит картинки постов в хранилище по хешу содержимого'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=media.MIGRATE_BATCH_SIZE,
+            help='Сколько постов переносить в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        result = media.migrate_files(options['batch_size'])
+        for name in result['missing']:
+            self.stderr.write(f'Нет файла: {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {result["posts"]}, '
+            f'уникальных файлов: {result["files"]}'))
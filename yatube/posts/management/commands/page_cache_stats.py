@@ -0,0 +1,21 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts.caching import EVENTS, page_stats
+
+CACHED_VIEWS = ('posts:index', 'posts:group_list', 'posts:profile')
+
+
+class Command(BaseCommand):
+    help = 'Показывает, как ленты отдавались из общего кэша страниц'
+
+    def handle(self, *args, **options):
+        self.stdout.write('\t'.join(('view',) + EVENTS))
+        for view in CACHED_VIEWS:
+            stats = page_stats(view)
+            self.stdout.write('\t'.join(
+                [view] + [str(stats[event]) for event in EVENTS]))
+        if hasattr(cache, 'stats'):
+            backend = ', '.join(
+                f'{name}: {value}' for name, value in cache.stats().items())
+            self.stdout.write(f'Кэш: {backend}')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+from posts.models import ImportCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Переиндексирует тексты постов для полнотекстового поиска'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=search.REINDEX_BATCH_SIZE,
+            help='Сколько постов индексировать в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite')
+        search.create_triggers()
+        total = search.rebuild_index(options['batch_size'])
+        ImportCheckpoint.objects.update(triggers_dropped=False)
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {total}'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import FANOUT_BATCH_SIZE, rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок из таблиц Follow и Post'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=FANOUT_BATCH_SIZE,
+            help='Размер пачки при вставке записей ленты',
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_timelines(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Лента пересобрана: {total} записей'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики постов, комментариев и подписок с таблицами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        result = repair_counters(dry_run=options['dry_run'])
+        verb = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(
+            f'Нет статистики у пользователей: {result["created"]}\n'
+            f'{verb} пользователей: {result["users"]}\n'
+            f'{verb} постов: {result["posts"]}'
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import purge
+from posts.models import PurgeJob
+
+
+class Command(BaseCommand):
+    help = 'Выполняет незавершённые удаления пользователей и групп'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Сколько строк удалять в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        jobs = PurgeJob.objects.exclude(state=PurgeJob.DONE).order_by('pk')
+        for job in jobs:
+            if purge.run(job.pk, options['chunk_size']):
+                self.stdout.write(f'{job}: удалено')
+            else:
+                self.stderr.write(f'{job}: ошибка, см. журнал')
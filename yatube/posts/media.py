@@ -0,0 +1,340 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from . import caching, thumbnails, variants
+from .models import ImageVariant, Post, StoredFile
+from .storage import TMP_DIR, content_storage, is_content_name
+from .utils import batches
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_BATCH_SIZE = 100
+GC_BATCH_SIZE = 500
+# Свежие файлы не трогаем: пост с только что загруженной картинкой
+# может быть ещё не закоммичен.
+GC_MIN_AGE = 60 * 60
+# Хранилище обновляет mtime, когда переиспользует файл: такой файл
+# только что понадобился новому посту, и purge его не удаляет.
+PURGE_MIN_AGE = 60
+POSTS_DIR = Post._meta.get_field('image').upload_to.rstrip('/')
+
+
+def acquire(name):
+    """Учитывает ещё одну ссылку на файл."""
+    if not name:
+        return
+    if StoredFile.objects.filter(name=name).update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refs=1)
+    except IntegrityError:
+        # Строку только что создал параллельный запрос.
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def pin(name):
+    """Временная ссылка на файл, который только что сохранило хранилище.
+
+    Снимается после коммита, когда ссылку уже учёл сохранённый пост;
+    если транзакция откатится, файл без ссылок уберёт сборщик мусора.
+    """
+    acquire(name)
+    transaction.on_commit(lambda: release(name))
+
+
+def release(name):
+    """Снимает ссылку; файл без ссылок удаляется после коммита."""
+    if not name:
+        return
+    StoredFile.objects.filter(name=name).update(refs=F('refs') - 1)
+    transaction.on_commit(lambda: purge(name))
+
+
+def _is_recent(name, min_age):
+    try:
+        modified = os.path.getmtime(content_storage.path(name))
+    except (OSError, SuspiciousFileOperation):
+        return False
+    return time.time() - modified < min_age
+
+
+def purge(name, min_age=PURGE_MIN_AGE):
+    """Удаляет файл, его миниатюры и варианты, если на него не ссылаются.
+
+    Посты проверяются и напрямую: у файлов, загруженных до учёта ссылок
+    или через bulk-операции, счётчика может не быть. Проверки и удаление
+    идут под блокировкой записи, которую хранилище берёт перед тем,
+    как переиспользовать файл.
+    """
+    with transaction.atomic():
+        # Пустое обновление берёт блокировку записи до проверок.
+        StoredFile.objects.filter(name=name).update(refs=F('refs'))
+        if StoredFile.objects.filter(name=name, refs__gt=0).exists():
+            return False
+        if Post.objects.filter(image=name).exists():
+            return False
+        if _is_recent(name, min_age):
+            return False
+        StoredFile.objects.filter(name=name).delete()
+        variants.delete(name)
+        # Уборка не должна ронять запрос, после которого она запущена.
+        try:
+            default.kvstore.delete(ImageFile(name, content_storage))
+            thumbnails.forget(name)
+            content_storage.delete(name)
+        except Exception:
+            logger.exception('Не удалось удалить файл %s', name)
+    return True
+
+
+def _move(name):
+    with content_storage.open(name) as file:
+        return content_storage.save(name, file)
+
+
+def migrate_files(batch_size=MIGRATE_BATCH_SIZE):
+    """Переносит картинки постов в хранилище по хешу пачками.
+
+    Каждая пачка — своя транзакция: прерванный перенос продолжается
+    с того места, где остановился. Старые файлы удаляются после
+    коммита, когда на них не остаётся ссылок.
+    """
+    last_id = 0
+    result = {'posts': 0, 'files': set(), 'missing': []}
+    while True:
+        posts = list(
+            Post.objects.filter(id__gt=last_id).exclude(image='')
+            .order_by('id').only('id', 'image', 'author', 'group')
+            [:batch_size]
+        )
+        if not posts:
+            break
+        last_id = posts[-1].id
+        moved = {}
+        with transaction.atomic():
+            for post in posts:
+                old = post.image.name
+                if is_content_name(old):
+                    continue
+                if old not in moved:
+                    try:
+                        moved[old] = _move(old)
+                    except FileNotFoundError:
+                        result['missing'].append(old)
+                        continue
+                new = moved[old]
+                Post.objects.filter(id=post.id, image=old).update(
+                    image=new, updated_at=timezone.now())
+                acquire(new)
+                release(old)
+                caching.bump_on_commit(*caching.post_scopes(post))
+                result['posts'] += 1
+            for new in set(moved.values()):
+                thumbnails.schedule(new)
+        result['files'].update(moved.values())
+    result['files'] = len(result['files'])
+    return result
+
+
+def _media_files(root, min_age):
+    """Файлы MEDIA_ROOT по одному: (имя в хранилище, путь, размер)."""
+    newest = time.time() - min_age
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > newest:
+                continue
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            yield name, path, stat.st_size
+
+
+def _kind(name):
+    top = name.split('/', 1)[0]
+    if top == POSTS_DIR:
+        return 'posts'
+    if top == variants.VARIANTS_DIR:
+        return 'variants'
+    if top == TMP_DIR:
+        return 'tmp'
+    if name.startswith(sorl_settings.THUMBNAIL_PREFIX):
+        return 'thumbnails'
+    return None
+
+
+def _kvstore_in_db():
+    return sorl_settings.THUMBNAIL_KVSTORE == thumbnails.CACHED_DB_KVSTORE
+
+
+def _thumbnail_key(name):
+    return add_prefix(ImageFile(name, default.storage).key)
+
+
+def _referenced(kind, names):
+    """Какие из имён одного вида ещё нужны."""
+    if kind == 'posts':
+        return set(Post.objects.filter(image__in=names).values_list(
+            'image', flat=True)) | set(StoredFile.objects.filter(
+                name__in=names, refs__gt=0).values_list('name', flat=True))
+    if kind == 'variants':
+        return set(ImageVariant.objects.filter(
+            name__in=names,
+            source__in=Post.objects.values('image'),
+        ).values_list('name', flat=True))
+    if kind == 'thumbnails':
+        keys = {_thumbnail_key(name): name for name in names}
+        return {
+            keys[key] for key in KVStore.objects.filter(
+                key__in=list(keys)).values_list('key', flat=True)
+        }
+    return set()
+
+
+def _orphan_sources(batch_size):
+    """Записи KV об исходных картинках, которые не нужны ни одному посту.
+
+    Миниатюры, построенные через другое хранилище, шаблон уже не
+    найдёт — их источники тоже считаются ненужными.
+    """
+    prefix = add_prefix('')
+    storage = ImageFile(POSTS_DIR, content_storage).serialize_storage()
+    last = prefix
+    while True:
+        rows = list(
+            KVStore.objects.filter(key__startswith=prefix, key__gt=last)
+            .order_by('key').values_list('key', 'value')[:batch_size]
+        )
+        if not rows:
+            return
+        last = rows[-1][0]
+        images = [deserialize_image_file(value) for key, value in rows]
+        sources = [
+            image for image in images
+            if not image.name.startswith(sorl_settings.THUMBNAIL_PREFIX)
+        ]
+        alive = set(Post.objects.filter(
+            image__in=[source.name for source in sources]
+        ).values_list('image', flat=True))
+        for source in sources:
+            if source.name not in alive or (
+                    source.serialize_storage() != storage):
+                yield source
+
+
+def _forget_thumbnails(source, dry_run):
+    """Убирает из KV источник и его миниатюры; файлы удалит обход.
+
+    Возвращает число и размер миниатюр — при dry_run обход их не увидит.
+    """
+    kvstore = default.kvstore
+    keys = kvstore._get(source.key, identity='thumbnails') or []
+    found = 0
+    size = 0
+    for key in keys:
+        thumbnail = kvstore._get(key)
+        if thumbnail is None or not thumbnail.exists():
+            continue
+        found += 1
+        size += thumbnail.storage.size(thumbnail.name)
+        if not dry_run:
+            kvstore._delete(key)
+    if not dry_run:
+        kvstore._delete(source.key, identity='thumbnails')
+        kvstore._delete(source.key)
+    return found, size
+
+
+def _remove_empty_dirs(path, root):
+    # Пустые каталоги шардов убираем вслед за последним файлом.
+    directory = os.path.dirname(path)
+    while directory != root:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def _remove(kind, name, path, root, min_age):
+    """Удаляет файл; False — он нужен или уже удалён."""
+    if kind == 'posts':
+        # Картинку могло переиспользовать хранилище после сверки:
+        # purge проверяет ссылки и mtime заново под блокировкой записи.
+        if not purge(name, min_age):
+            return False
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+    _remove_empty_dirs(path, root)
+    return True
+
+
+def _by_kind(chunk):
+    by_kind = {}
+    for name, path, size in chunk:
+        kind = _kind(name)
+        if kind == 'thumbnails' and not _kvstore_in_db():
+            continue
+        if kind is not None:
+            by_kind.setdefault(kind, []).append((name, path, size))
+    return by_kind
+
+
+def _collect_chunk(chunk, root, dry_run, rate, min_age, result):
+    for kind, files in _by_kind(chunk).items():
+        referenced = _referenced(kind, [name for name, *rest in files])
+        for name, path, size in files:
+            if name in referenced:
+                continue
+            if not dry_run:
+                if not _remove(kind, name, path, root, min_age):
+                    continue
+                if rate:
+                    time.sleep(1 / rate)
+            result[kind][0] += 1
+            result[kind][1] += size
+
+
+def collect_garbage(dry_run=False, rate=None, min_age=GC_MIN_AGE,
+                    batch_size=GC_BATCH_SIZE):
+    """Удаляет из MEDIA_ROOT картинки, миниатюры и варианты без ссылок.
+
+    Дерево обходится потоком и сверяется с БД пачками по batch_size,
+    поэтому список всех файлов в памяти не держится. rate ограничивает
+    число удалений в секунду. Возвращает {вид: [файлов, байт]}.
+    """
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    result = {
+        kind: [0, 0] for kind in ('posts', 'variants', 'thumbnails', 'tmp')
+    }
+    if _kvstore_in_db():
+        for source in _orphan_sources(batch_size):
+            found, size = _forget_thumbnails(source, dry_run)
+            if dry_run:
+                result['thumbnails'][0] += found
+                result['thumbnails'][1] += size
+    for chunk in batches(_media_files(root, min_age), batch_size):
+        _collect_chunk(chunk, root, dry_run, rate, min_age, result)
+    if not dry_run:
+        ImageVariant.objects.exclude(
+            source__in=Post.objects.values('image')).delete()
+    return result
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.28 on 2026-10-18 02:36
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def _counts(model, field):
+    return dict(
+        model.objects.values_list(field).annotate(total=Count('pk'))
+        .order_by()
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    posts = _counts(Post, 'author')
+    comments = _counts(Comment, 'author')
+    followers = _counts(Follow, 'author')
+    following = _counts(Follow, 'user')
+    UserStats.objects.bulk_create(
+        [UserStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            comments_count=comments.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        ) for user_id in User.objects.values_list('pk', flat=True)],
+        batch_size=500,
+    )
+    for post_id, total in _counts(Comment, 'post').items():
+        Post.objects.filter(pk=post_id).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0011_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Число постов')),
+                ('comments_count', models.IntegerField(default=0, verbose_name='Число комментариев')),
+                ('followers_count', models.IntegerField(db_index=True, default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Число подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
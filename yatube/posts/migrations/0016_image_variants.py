@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Исходная картинка')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('name', models.CharField(max_length=255, verbose_name='Файл')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер в байтах')),
+            ],
+            options={
+                'verbose_name': 'Вариант картинки',
+                'verbose_name_plural': 'Варианты картинок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagevariant',
+            constraint=models.UniqueConstraint(fields=('source', 'format', 'width'), name='unique_image_variants'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_stored_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True, verbose_name='Источник')),
+                ('lines', models.PositiveIntegerField(default=0, verbose_name='Загружено строк')),
+                ('post_offset', models.PositiveIntegerField(verbose_name='Сдвиг id постов')),
+                ('comment_offset', models.PositiveIntegerField(verbose_name='Сдвиг id комментариев')),
+                ('finished', models.BooleanField(default=False, verbose_name='Завершён')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Импорт',
+                'verbose_name_plural': 'Импорты',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_purge_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='pulled',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Посты не разложены по лентам'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_user_stats_pulled'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedId',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=255, verbose_name='Источник')),
+                ('kind', models.CharField(choices=[('post', 'Пост'), ('comment', 'Комментарий')], max_length=10, verbose_name='Что загружено')),
+                ('source_id', models.PositiveIntegerField(verbose_name='id в источнике')),
+                ('target_id', models.PositiveIntegerField(verbose_name='id на сайте')),
+            ],
+            options={
+                'verbose_name': 'Загруженный id',
+                'verbose_name_plural': 'Загруженные id',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='importcheckpoint',
+            name='comment_offset',
+        ),
+        migrations.RemoveField(
+            model_name='importcheckpoint',
+            name='post_offset',
+        ),
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='triggers_dropped',
+            field=models.BooleanField(default=False, help_text='Остаётся после убитого импорта, пока индекс не пересобран', verbose_name='Триггеры поиска сняты'),
+        ),
+        migrations.AddConstraint(
+            model_name='importedid',
+            constraint=models.UniqueConstraint(fields=('origin', 'kind', 'source_id'), name='unique_imported_ids'),
+        ),
+    ]
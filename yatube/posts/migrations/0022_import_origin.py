@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_import_id_map'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='origin',
+            field=models.CharField(blank=True, help_text='Из заголовка выгрузки или --origin; пусто — как источник', max_length=255, verbose_name='Сайт'),
+        ),
+        migrations.AlterField(
+            model_name='importedid',
+            name='origin',
+            field=models.CharField(max_length=255, verbose_name='Сайт'),
+        ),
+    ]
@@ -1,20 +1,48 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from .storage import content_storage
 
 
 User = get_user_model()
 
 
+class AtomicSaveModel(models.Model):
+    """Модель, чьи post_save-обработчики выполняются в той же транзакции.
+
+    Нужна для счётчиков: запись и её учёт фиксируются вместе.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    is_active = models.BooleanField(
+        'Активна',
+        default=True,
+        help_text='Снимается при удалении, пока удаляются связи группы'
+    )
 
     def __str__(self):
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        # Автор, которого удаляют, скрыт сразу, а не после удаления постов.
+        return self.select_related('author', 'group').filter(
+            author__is_active=True)
+
+
+class Post(AtomicSaveModel):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
@@ -23,6 +51,10 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -41,19 +73,48 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=content_storage,
+        blank=True,
+        # По имени файла ищутся посты при снятии ссылки и уборке.
+        db_index=True
     )
+    comments_count = models.IntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_feed_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class CommentQuerySet(models.QuerySet):
+    def for_feed(self):
+        return self.select_related('author').filter(author__is_active=True)
+
+
+class Comment(AtomicSaveModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -75,14 +136,22 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_feed_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -101,3 +170,190 @@ class Follow(models.Model):
                 name='unique_follows'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField('Число постов', default=0)
+    comments_count = models.IntegerField('Число комментариев', default=0)
+    followers_count = models.IntegerField(
+        'Число подписчиков',
+        default=0,
+        db_index=True
+    )
+    following_count = models.IntegerField('Число подписок', default=0)
+    pulled = models.BooleanField(
+        'Посты не разложены по лентам',
+        default=False,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entries'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx'
+            )
+        ]
+
+
+class ImageVariant(models.Model):
+    source = models.CharField('Исходная картинка', max_length=255)
+    width = models.PositiveIntegerField('Ширина')
+    format = models.CharField('Формат', max_length=10)
+    name = models.CharField('Файл', max_length=255)
+    size = models.PositiveIntegerField('Размер в байтах')
+
+    class Meta:
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'format', 'width'],
+                name='unique_image_variants'
+            )
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class StoredFile(models.Model):
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    refs = models.IntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл в хранилище'
+        verbose_name_plural = 'Файлы в хранилище'
+
+    def __str__(self):
+        return self.name
+
+
+class ImportCheckpoint(models.Model):
+    source = models.CharField('Источник', max_length=255, unique=True)
+    origin = models.CharField(
+        'Сайт',
+        max_length=255,
+        blank=True,
+        help_text='Из заголовка выгрузки или --origin; пусто — как источник'
+    )
+    lines = models.PositiveIntegerField('Загружено строк', default=0)
+    finished = models.BooleanField('Завершён', default=False)
+    triggers_dropped = models.BooleanField(
+        'Триггеры поиска сняты',
+        default=False,
+        help_text='Остаётся после убитого импорта, пока индекс не пересобран'
+    )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Импорт'
+        verbose_name_plural = 'Импорты'
+
+    def __str__(self):
+        return self.source
+
+
+class ImportedId(models.Model):
+    POST = 'post'
+    COMMENT = 'comment'
+    KINDS = (
+        (POST, 'Пост'),
+        (COMMENT, 'Комментарий'),
+    )
+
+    origin = models.CharField('Сайт', max_length=255)
+    kind = models.CharField('Что загружено', max_length=10, choices=KINDS)
+    source_id = models.PositiveIntegerField('id в источнике')
+    target_id = models.PositiveIntegerField('id на сайте')
+
+    class Meta:
+        verbose_name = 'Загруженный id'
+        verbose_name_plural = 'Загруженные id'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['origin', 'kind', 'source_id'],
+                name='unique_imported_ids'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.origin} {self.kind} {self.source_id}'
+
+
+class PurgeJob(models.Model):
+    USER = 'user'
+    GROUP = 'group'
+    KINDS = (
+        (USER, 'Пользователь'),
+        (GROUP, 'Группа'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField('Что удаляется', max_length=10, choices=KINDS)
+    object_id = models.PositiveIntegerField('id')
+    label = models.CharField('Название', max_length=255)
+    state = models.CharField(
+        'Состояние', max_length=10, choices=STATES, default=PENDING)
+    total = models.PositiveIntegerField('Всего строк', default=0)
+    done = models.PositiveIntegerField('Удалено строк', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Удаление'
+        verbose_name_plural = 'Удаления'
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.label}'
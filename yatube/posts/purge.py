@@ -0,0 +1,171 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+
+from . import caching
+from .models import (
+    Comment, Follow, Group, Post, PurgeJob, TimelineEntry, User, UserStats
+)
+
+logger = logging.getLogger(__name__)
+
+DELETE = 'delete'
+UNGROUP = 'ungroup'
+MODELS = {PurgeJob.USER: User, PurgeJob.GROUP: Group}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PURGE_WORKERS,
+            thread_name_prefix='purge',
+        )
+    return _executor
+
+
+def _steps(job):
+    """Что удалить до самого объекта, чтобы каскад сборщика Django
+    оказался пустым. Ленты и комментарии идут раньше постов: иначе
+    удаление пачки постов потянуло бы за собой все их строки разом.
+    """
+    pk = job.object_id
+    if job.kind == PurgeJob.GROUP:
+        return [(Post.objects.filter(group_id=pk), UNGROUP)]
+    return [
+        (TimelineEntry.objects.filter(user_id=pk), DELETE),
+        (TimelineEntry.objects.filter(post__author_id=pk), DELETE),
+        (Follow.objects.filter(Q(user_id=pk) | Q(author_id=pk)), DELETE),
+        (Comment.objects.filter(author_id=pk), DELETE),
+        (Comment.objects.filter(post__author_id=pk), DELETE),
+        (Post.objects.filter(author_id=pk), DELETE),
+    ]
+
+
+def _ungroup(ids):
+    posts = Post.objects.filter(pk__in=ids)
+    authors = set(posts.values_list('author_id', flat=True))
+    posts.update(group=None)
+    caching.bump_on_commit(
+        caching.INDEX,
+        *(caching.author_scope(author_id) for author_id in authors),
+        *(caching.post_scope(post_id) for post_id in ids),
+    )
+
+
+def _purge_rows(job, queryset, action, chunk_size):
+    """Удаляет строки пачками, каждая пачка — короткая транзакция."""
+    model = queryset.model
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('pk').values_list(
+                'pk', flat=True)[:chunk_size])
+            if not ids:
+                return
+            if action == UNGROUP:
+                _ungroup(ids)
+            else:
+                # Через delete(), чтобы сработали сигналы счётчиков и кэша.
+                model.objects.filter(pk__in=ids).delete()
+            PurgeJob.objects.filter(pk=job.pk).update(
+                done=F('done') + len(ids))
+
+
+def run(job_id, chunk_size=None):
+    """Выполняет или продолжает удаление; повторный запуск безопасен."""
+    chunk_size = chunk_size or settings.PURGE_CHUNK_SIZE
+    job = PurgeJob.objects.get(pk=job_id)
+    steps = _steps(job)
+    PurgeJob.objects.filter(pk=job.pk).update(
+        state=PurgeJob.RUNNING,
+        total=job.done + sum(queryset.count() for queryset, action in steps),
+        error='',
+    )
+    try:
+        for queryset, action in steps:
+            _purge_rows(job, queryset, action, chunk_size)
+        MODELS[job.kind].objects.filter(pk=job.object_id).delete()
+    except Exception as error:
+        logger.exception('Не удалось удалить %s', job)
+        PurgeJob.objects.filter(pk=job.pk).update(
+            state=PurgeJob.FAILED, error=str(error))
+        return False
+    PurgeJob.objects.filter(pk=job.pk).update(state=PurgeJob.DONE)
+    return True
+
+
+def _run_in_worker(job_id):
+    try:
+        run(job_id)
+    finally:
+        # У потока своё соединение с БД, его никто больше не закроет.
+        connection.close()
+
+
+def start(job):
+    """Запускает задание в фоновом потоке после коммита."""
+    if not settings.PURGE_WORKERS:
+        transaction.on_commit(lambda: run(job.pk))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run_in_worker, job.pk))
+
+
+def schedule(obj):
+    """Сразу деактивирует пользователя или группу, а связанные строки
+    удаляет в фоне пачками.
+    """
+    if isinstance(obj, Group):
+        kind, scope = PurgeJob.GROUP, caching.group_scope(obj.pk)
+    else:
+        kind, scope = PurgeJob.USER, caching.author_scope(obj.pk)
+    with transaction.atomic():
+        obj.is_active = False
+        obj.save(update_fields=['is_active'])
+        # Закэшированная страница иначе отдавалась бы до конца удаления.
+        caching.bump_on_commit(scope)
+        job = PurgeJob.objects.filter(
+            kind=kind,
+            object_id=obj.pk,
+            state__in=(PurgeJob.PENDING, PurgeJob.RUNNING),
+        ).first()
+        if job is None:
+            job = PurgeJob.objects.create(
+                kind=kind, object_id=obj.pk, label=str(obj))
+            start(job)
+    return job
+
+
+def summary(objs):
+    """Что удалит задание, для страницы подтверждения в админке.
+
+    Счётчики вместо дерева связанных строк: админка собрала бы его
+    целиком, а у автора могут быть сотни тысяч постов.
+    """
+    objs = list(objs)
+    if isinstance(objs[0], Group):
+        counts = {
+            'Группы': len(objs),
+            'Посты без группы': Post.objects.filter(group__in=objs).count(),
+        }
+    else:
+        stats = UserStats.objects.filter(user__in=objs).aggregate(
+            posts=Sum('posts_count'),
+            comments=Sum('comments_count'),
+            followers=Sum('followers_count'),
+            following=Sum('following_count'),
+        )
+        counts = {
+            'Пользователи': len(objs),
+            'Посты': stats['posts'] or 0,
+            'Комментарии': stats['comments'] or 0,
+            'Подписки': (stats['followers'] or 0) + (stats['following'] or 0),
+        }
+    lines = [str(obj) for obj in objs] + [
+        f'{label}: {count}' for label, count in counts.items()]
+    return lines, counts
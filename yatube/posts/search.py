@@ -0,0 +1,209 @@
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import POSTS_ORDERING
+
+SEARCH_TABLE = 'posts_post_fts'
+SEARCH_ORDERING = ('rank', 'id')
+REINDEX_BATCH_SIZE = 1000
+SNIPPET_TOKENS = 24
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+CREATE_TABLE = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+    text,
+    content='posts_post',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+'''
+# Триггеры живут на posts_post и пропадают, когда миграция SQLite
+# пересоздаёт таблицу, поэтому create_triggers вызывается после migrate.
+TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {SEARCH_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+)
+TRIGGER_NAMES = tuple(
+    f'{SEARCH_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au'))
+
+MATCHES = f'''
+SELECT rowid AS id,
+       bm25({SEARCH_TABLE}) AS rank,
+       snippet({SEARCH_TABLE}, 0, '{_MARK_START}', '{_MARK_END}', '…',
+               {SNIPPET_TOKENS}) AS snippet
+FROM {SEARCH_TABLE}
+WHERE {SEARCH_TABLE} MATCH %s
+'''
+
+
+COMMAND = f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES (%s)'
+
+
+def _command(name):
+    with connection.cursor() as cursor:
+        cursor.execute(COMMAND, [name])
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def create_index(schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    schema_editor.execute(CREATE_TABLE)
+    create_triggers(schema_editor.connection)
+    schema_editor.execute(COMMAND, ['rebuild'])
+
+
+def drop_index(schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    drop_triggers(schema_editor.connection)
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def create_triggers(using=connection):
+    if not is_supported(using):
+        return
+    if SEARCH_TABLE not in using.introspection.table_names():
+        return
+    with using.cursor() as cursor:
+        for trigger in TRIGGERS:
+            cursor.execute(trigger)
+
+
+def drop_triggers(using=connection):
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        for name in TRIGGER_NAMES:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def rebuild_index(batch_size=REINDEX_BATCH_SIZE):
+    """Переиндексирует посты пачками по batch_size в коротких транзакциях."""
+    last_id = 0
+    total = 0
+    _command('delete-all')
+    while True:
+        ids = list(
+            Post.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE}(rowid, text) '
+                'SELECT id, text FROM posts_post WHERE id BETWEEN %s AND %s',
+                [ids[0], ids[-1]],
+            )
+        last_id = ids[-1]
+        total += len(ids)
+    _command('optimize')
+    return total
+
+
+def to_match(query):
+    """Превращает пользовательский запрос в безопасное выражение FTS5.
+
+    Каждое слово ищется как префикс, слова объединяются через AND.
+    """
+    terms = []
+    for word in query.split():
+        word = word.replace('"', '""')
+        terms.append(f'"{word}"*')
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(_MARK_START, '<mark>')
+        .replace(_MARK_END, '</mark>')
+    )
+
+
+def matching_ids(query):
+    """SQL и параметры подзапроса с id найденных постов."""
+    return (
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+        [to_match(query)],
+    )
+
+
+def search_posts(query):
+    """Источник для KeysetPaginator и его порядок сортировки."""
+    if is_supported():
+        return SearchFeed(query), SEARCH_ORDERING
+    posts = Post.objects.for_feed().filter(text__icontains=query)
+    return posts, POSTS_ORDERING
+
+
+class SearchFeed:
+    """Результаты поиска по индексу FTS5, ранжированные по bm25.
+
+    Листается KeysetPaginator по ключу (rank, id): меньший rank у более
+    релевантных постов.
+    """
+    model = Post
+
+    def __init__(self, query):
+        self.match = to_match(query)
+
+    def seek(self, key, reverse, limit):
+        sql = f'SELECT * FROM ({MATCHES})'
+        params = [self.match]
+        if key is not None:
+            sign = '<' if reverse else '>'
+            sql += f' WHERE rank {sign} %s OR (rank = %s AND id {sign} %s)'
+            params += [key[0], key[0], key[1]]
+        direction = 'DESC' if reverse else 'ASC'
+        sql += f' ORDER BY rank {direction}, id {direction} LIMIT %s'
+        return self._fetch(sql, params + [limit])
+
+    def slice(self, offset, limit):
+        sql = (
+            f'SELECT * FROM ({MATCHES}) '
+            'ORDER BY rank, id LIMIT %s OFFSET %s'
+        )
+        return self._fetch(sql, [self.match, limit, offset])
+
+    def _fetch(self, sql, params):
+        if not self.match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk([row[0] for row in rows])
+        results = []
+        for post_id, rank, snippet in rows:
+            post = posts.get(post_id)
+            if post is None:
+                continue
+            post.rank = rank
+            post.snippet = highlight(snippet)
+            results.append(post)
+        return results
@@ -0,0 +1,168 @@
+from django.db import connections
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from . import caching, counters, feeds, media, search
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feeds.push_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments_count(instance.post_id, 1)
+        counters.change_user_stats(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+    counters.change_user_stats(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Прежняя группа нужна, чтобы сбросить и её ленту, когда пост
+    # переносят в другую группу. Отложенное поле не загружаем.
+    instance._saved_group_id = instance.__dict__.get('group_id')
+
+
+def _image_name(instance):
+    # Поле может быть не загружено (only/defer) — тогда и не менялось.
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    instance._saved_image = _image_name(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, raw=False, **kwargs):
+    if raw or 'image' not in instance.__dict__:
+        return
+    old = '' if created else instance._saved_image
+    new = _image_name(instance)
+    if new != old:
+        media.acquire(new)
+        media.release(old)
+    instance._saved_image = new
+
+
+@receiver(pre_delete, sender=Post)
+def load_deleted_post(sender, instance, **kwargs):
+    # Обработчикам удаления нужны автор, группа и картинка. У поста из
+    # only()/defer() их может не быть, а после удаления строки
+    # их уже не прочитать.
+    deferred = instance.get_deferred_fields()
+    if deferred:
+        instance.refresh_from_db(fields=list(deferred))
+        instance._saved_image = _image_name(instance)
+        instance._saved_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    media.release(instance._saved_image)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = set(caching.post_scopes(instance))
+    if instance._saved_group_id is not None:
+        scopes.add(caching.group_scope(instance._saved_group_id))
+    caching.bump_on_commit(*scopes)
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    authors = Post.objects.filter(group=instance).values_list(
+        'author_id', flat=True).distinct()
+    caching.bump_on_commit(
+        caching.INDEX,
+        caching.group_scope(instance.id),
+        *(caching.author_scope(author_id) for author_id in authors),
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, created, raw=False,
+                            update_fields=None, **kwargs):
+    if created or raw or update_fields == {'last_login'}:
+        return
+    groups = Post.objects.filter(author=instance).exclude(
+        group=None).values_list('group_id', flat=True).distinct()
+    caching.bump_on_commit(
+        caching.INDEX,
+        caching.USERS,
+        caching.author_scope(instance.id),
+        *(caching.group_scope(group_id) for group_id in groups),
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follows(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.bump_on_commit(caching.follows_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feeds.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    feeds.prune(instance)
+    feeds.schedule_catch_up(instance.author_id)
+
+
+def create_search_triggers(sender, using, **kwargs):
+    search.create_triggers(connections[using])
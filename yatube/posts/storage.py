@@ -0,0 +1,77 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+TMP_DIR = 'tmp'
+CONTENT_NAME = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_name(directory, digest, ext):
+    """Имя файла по хешу содержимого: posts/ab/cd/<sha256>.<ext>."""
+    return f'{directory}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+def is_content_name(name):
+    return bool(CONTENT_NAME.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под sha256 содержимого.
+
+    Загрузка пишется во временный файл кусками и одновременно хешируется,
+    поэтому в память целиком не попадает. Одинаковые файлы получают одно
+    имя и лежат на диске один раз; сколько постов ссылается на файл,
+    считает posts.media. Сохранённый файл закреплён ссылкой до коммита
+    транзакции, в которой его сохранили.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяет содержимое, занятое имя — это тот же файл.
+        return name
+
+    def _pin(self, name):
+        # posts.media импортирует это хранилище.
+        from .media import pin
+        pin(name)
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        tmp_dir = self.path(TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            name = content_name(directory, digest.hexdigest(), ext)
+            path = self.path(name)
+            # Ссылка берётся до проверки файла и под той же блокировкой
+            # записи, под которой media.purge удаляет файлы без ссылок.
+            with transaction.atomic():
+                self._pin(name)
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                    # Сборщик мусора и purge не трогают свежие файлы.
+                    os.utime(path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name.replace('\\', '/')
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,10 @@
+from django import template
+
+from .. import fragments
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_articles(posts):
+    return fragments.render_articles(list(posts))
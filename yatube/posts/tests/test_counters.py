@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..counters import repair_counters
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_posts_and_comments(self):
+        """Счётчики меняются при создании и удалении записей"""
+        post = Post.objects.create(
+            author=CountersTest.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=CountersTest.reader, text='Комментарий')
+        Follow.objects.create(
+            user=CountersTest.reader, author=CountersTest.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 1)
+        self.assertEqual(self.stats(CountersTest.author).followers_count, 1)
+        self.assertEqual(self.stats(CountersTest.reader).following_count, 1)
+        self.assertEqual(self.stats(CountersTest.reader).comments_count, 1)
+        comment.delete()
+        Follow.objects.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(CountersTest.reader).comments_count, 0)
+        self.assertEqual(self.stats(CountersTest.author).followers_count, 0)
+
+    def test_user_cascade_updates_counters(self):
+        """Каскадное удаление пользователя обновляет чужие счётчики"""
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(
+            author=CountersTest.reader, text='Пост')
+        Comment.objects.create(post=post, author=author, text='Ответ')
+        Follow.objects.create(user=author, author=CountersTest.reader)
+        author.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(CountersTest.reader).followers_count, 0)
+
+    def test_repair_counters_command(self):
+        """repair_counters исправляет разошедшиеся счётчики"""
+        Post.objects.bulk_create(
+            Post(author=CountersTest.author, text=f'Пост {number}')
+            for number in range(3)
+        )
+        UserStats.objects.filter(user=CountersTest.reader).delete()
+        call_command('repair_counters', '--dry-run', stdout=StringIO())
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 0)
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(self.stats(CountersTest.author).posts_count, 3)
+        self.assertTrue(
+            UserStats.objects.filter(user=CountersTest.reader).exists())
+
+    def test_repair_in_batches(self):
+        """Починка идёт пачками и возвращает число исправленных строк"""
+        Post.objects.bulk_create(
+            Post(author=CountersTest.author, text=f'Пост {number}')
+            for number in range(3)
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=CountersTest.reader, text='Ответ')
+            for post in Post.objects.all()
+        )
+        self.assertEqual(
+            repair_counters(batch_size=1),
+            {'created': 0, 'users': 2, 'posts': 3})
+        self.assertEqual(
+            repair_counters(),
+            {'created': 0, 'users': 0, 'posts': 0})
+        self.assertEqual(self.stats(CountersTest.reader).comments_count, 3)
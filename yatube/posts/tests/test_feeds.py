@@ -0,0 +1,182 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import feeds
+from ..models import Follow, Post, TimelineEntry, UserStats
+from .utils import run_on_commit
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TimelineTest.reader)
+
+    def timeline_posts(self, user):
+        return list(
+            TimelineEntry.objects.filter(user=user).values_list(
+                'post_id', flat=True)
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту старые посты автора"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author)
+        self.assertEqual(
+            self.timeline_posts(TimelineTest.reader),
+            [TimelineTest.old_post.id])
+
+    def test_new_post_pushed_to_followers(self):
+        """Новый пост попадает только в ленты подписчиков"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author)
+        post = Post.objects.create(
+            author=TimelineTest.author, text='Новый пост')
+        self.assertIn(post.id, self.timeline_posts(TimelineTest.reader))
+        self.assertEqual(self.timeline_posts(TimelineTest.stranger), [])
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author)
+        self.client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': TimelineTest.author.username})
+        )
+        self.assertEqual(self.timeline_posts(TimelineTest.reader), [])
+
+    def test_follow_index_pages_timeline(self):
+        """follow_index листает материализованную ленту курсором"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author)
+        Post.objects.bulk_create(
+            Post(author=TimelineTest.author, text=f'Пост {number}')
+            for number in range(11)
+        )
+        call_command('rebuild_timelines', stdout=StringIO())
+        response = self.client.get(reverse('posts:follow_index'))
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        response = self.client.get(
+            reverse('posts:follow_index')
+            + f'?cursor={first_page.next_cursor}'
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 2)
+        ids = [post.id for post in list(first_page) + list(second_page)]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)))
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            self.timeline_posts(TimelineTest.reader),
+            [TimelineTest.old_post.id])
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=1)
+class HybridFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(HybridFeedTest.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_heavy_author_is_not_pushed(self):
+        """Посты автора выше порога не раскладываются по лентам"""
+        post = Post.objects.create(
+            author=HybridFeedTest.star, text='Пост звезды')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=post).exists())
+
+    def test_follow_index_merges_pushed_and_pulled(self):
+        """follow_index сливает разложенные и дочитанные посты"""
+        for number in range(6):
+            Post.objects.create(
+                author=(HybridFeedTest.star if number % 2
+                        else HybridFeedTest.author),
+                text=f'Пост {number}',
+            )
+        Post.objects.create(
+            author=HybridFeedTest.fan, text='Чужой пост')
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            list(Post.objects.exclude(author=HybridFeedTest.fan).order_by(
+                '-pub_date', '-id').values_list('id', flat=True)))
+
+    def test_author_below_threshold_is_caught_up(self):
+        """Посты автора, опустившегося до порога, попадают в ленты"""
+        post = Post.objects.create(
+            author=HybridFeedTest.star, text='Пост звезды')
+        self.assertTrue(
+            UserStats.objects.get(user=HybridFeedTest.star).pulled)
+        with run_on_commit():
+            Follow.objects.filter(
+                user=HybridFeedTest.fan, author=HybridFeedTest.star).delete()
+            self.assertTrue(
+                UserStats.objects.get(user=HybridFeedTest.star).pulled)
+        self.assertFalse(
+            UserStats.objects.get(user=HybridFeedTest.star).pulled)
+        self.assertNotIn(HybridFeedTest.star.id, feeds.heavy_authors())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=HybridFeedTest.reader, post=post).exists())
+
+    def test_catch_up_in_batches(self):
+        """Дозаполнение проходит подписчиков пачками"""
+        posts = [
+            Post.objects.create(author=HybridFeedTest.star, text=f'Пост {n}')
+            for n in range(3)
+        ]
+        with override_settings(FEED_FANOUT_THRESHOLD=2):
+            self.assertTrue(feeds.catch_up(HybridFeedTest.star.id, 1))
+        for user in (HybridFeedTest.reader, HybridFeedTest.fan):
+            self.assertEqual(
+                TimelineEntry.objects.filter(
+                    user=user, post__in=posts).count(), 3)
+
+    def test_pulled_authors_read_in_one_query(self):
+        """Посты всех тяжёлых авторов дочитываются одним запросом"""
+        Follow.objects.create(
+            user=HybridFeedTest.fan, author=HybridFeedTest.author)
+        cache.clear()
+        feed = feeds.FollowFeed(HybridFeedTest.reader)
+        with self.assertNumQueries(2):
+            feed.seek(None, False, 10)
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -9,6 +10,7 @@ from django.urls import reverse
 from django.core.cache import cache
 from ..forms import PostForm, CommentForm
 from ..models import Post, Group, Comment
+from ..storage import content_name
 
 
 User = get_user_model()
@@ -20,6 +22,8 @@ SMALL_GIF = (
     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
     b'\x0A\x00\x3B')
+SMALL_GIF_NAME = content_name(
+    'posts', hashlib.sha256(SMALL_GIF).hexdigest(), '.gif')
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -80,7 +84,7 @@ class FormTests(TestCase):
             Post.objects.filter(
                 text='Текст поста',
                 group=FormTests.group,
-                image='posts/small.gif',
+                image=SMALL_GIF_NAME,
             ).exists()
         )
 
@@ -106,7 +110,7 @@ class FormTests(TestCase):
             Post.objects.filter(
                 text=form_data.get('text'),
                 group=FormTests.group,
-                image='posts/small.gif',
+                image=SMALL_GIF_NAME,
             ).exists())
 
     def test_comment_only_authorized_client(self):
@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .. import media, thumbnails
+from ..models import ImageVariant, Post, StoredFile
+from ..storage import is_content_name
+from .utils import run_on_commit
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='keeper')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, filename, content=SMALL_GIF):
+        with run_on_commit():
+            return Post.objects.create(
+                author=MediaStorageTest.user,
+                text='Пост с картинкой',
+                image=SimpleUploadedFile(filename, content),
+            )
+
+    def refs(self, name):
+        return StoredFile.objects.get(name=name).refs
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом по хешу"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(is_content_name(name))
+        self.assertRegex(name, r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.gif$')
+        self.assertTrue(os.path.exists(first.image.path))
+        self.assertEqual(self.refs(name), 2)
+        self.assertEqual(os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'tmp')),
+                         [])
+        Post.objects.only('id').get(pk=second.pk).delete()
+        self.assertEqual(self.refs(name), 1)
+        first.image = ''
+        first.save()
+        self.assertEqual(self.refs(name), 0)
+        self.assertFalse(media.purge(name))
+        self.assertTrue(media.purge(name, min_age=0))
+        self.assertFalse(os.path.exists(first.image.storage.path(name)))
+
+    def test_reused_file_is_pinned(self):
+        """Файл, который переиспользует новая загрузка, не удаляется,
+        пока пост с ним не закоммичен"""
+        first = self.create_post('first.gif')
+        name = first.image.name
+        first.delete()
+        with run_on_commit():
+            second = Post(author=MediaStorageTest.user, text='Второй')
+            second.image.save(
+                'second.gif', ContentFile(SMALL_GIF), save=False)
+            self.assertFalse(media.purge(name, min_age=0))
+            second.save()
+        self.assertTrue(os.path.exists(second.image.path))
+        self.assertEqual(self.refs(name), 1)
+
+    def test_migrate_media(self):
+        """migrate_media переносит старые файлы в хранилище по хешу"""
+        legacy = default_storage.save('posts/legacy.gif',
+                                      ContentFile(SMALL_GIF))
+        post = Post.objects.create(
+            author=MediaStorageTest.user, text='Старый пост', image=legacy)
+        self.assertEqual(self.refs(legacy), 1)
+        output = StringIO()
+        with run_on_commit():
+            call_command('migrate_media', '--batch-size', '1', stdout=output)
+        self.assertIn('Перенесено картинок: 1', output.getvalue())
+        post.refresh_from_db()
+        self.assertTrue(is_content_name(post.image.name))
+        self.assertEqual(self.refs(post.image.name), 1)
+        self.assertEqual(self.refs(legacy), 0)
+        self.assertTrue(media.purge(legacy, min_age=0))
+        self.assertFalse(default_storage.exists(legacy))
+
+    def media_files(self):
+        found = []
+        for root, dirs, files in os.walk(TEMP_MEDIA_ROOT):
+            found += [
+                os.path.relpath(os.path.join(root, name), TEMP_MEDIA_ROOT)
+                for name in files
+            ]
+        return sorted(found)
+
+    def test_collect_media_garbage(self):
+        """Сборщик удаляет только файлы, на которые нет ссылок"""
+        orphan = self.create_post('orphan.gif')
+        thumbnails.generate(orphan.image.name)
+        orphan_files = self.media_files()
+        buffer = BytesIO()
+        Image.new('RGB', (20, 10), 'red').save(buffer, 'PNG')
+        alive = self.create_post('alive.png', buffer.getvalue())
+        thumbnails.generate(alive.image.name)
+        kept = self.media_files()
+        orphan.delete()
+        default_storage.save('tmp/upload.part', ContentFile(b'part'))
+        before = self.media_files()
+
+        output = StringIO()
+        call_command('collect_media_garbage', '--dry-run', '--min-age', '0',
+                     stdout=output)
+        self.assertIn('tmp: файлов 1, байт 4', output.getvalue())
+        self.assertIn(f'posts: файлов 1, байт {len(SMALL_GIF)}',
+                      output.getvalue())
+        self.assertEqual(self.media_files(), before)
+
+        output = StringIO()
+        call_command('collect_media_garbage', '--min-age', '0',
+                     stdout=output)
+        self.assertIn('Освобождено байт:', output.getvalue())
+        self.assertEqual(
+            self.media_files(), sorted(set(kept) - set(orphan_files)))
+        self.assertFalse(ImageVariant.objects.filter(
+            source=orphan.image.name).exists())
+        self.assertTrue(ImageVariant.objects.filter(
+            source=alive.image.name).exists())
+
+    def test_collect_skips_reused_file(self):
+        """Файл, переиспользованный после обхода, сборщик не удаляет"""
+        post = self.create_post('reused.gif')
+        name = post.image.name
+        post.delete()
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        self.assertTrue(os.path.exists(path))
+        # Обход видел старый файл, а затем хранилище обновило mtime.
+        result = {'posts': [0, 0]}
+        media._collect_chunk(
+            [(name, path, len(SMALL_GIF))], TEMP_MEDIA_ROOT, False, None,
+            media.PURGE_MIN_AGE, result)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(result['posts'], [0, 0])
@@ -2,8 +2,13 @@ from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.templatetags.user_filters import pagination_window
 
 from ..models import Post, Group
+from ..utils import MAX_LEGACY_PAGE, KeysetPaginator
 
 User = get_user_model()
 
@@ -80,3 +85,70 @@ class PaginatorTest(TestCase):
                 kwargs={'username': PaginatorTest.user.username}) + '?page=2'
         )
         self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_index_cursor_pages(self):
+        """Переход по курсорам вперёд и назад"""
+        first = self.guest_client.get(reverse('posts:index'))
+        first_page = first.context['page_obj']
+        second = self.guest_client.get(
+            reverse('posts:index') + f'?cursor={first_page.next_cursor}'
+        )
+        second_page = second.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertEqual(second_page.number, 2)
+        self.assertFalse(second_page.has_next())
+        back = self.guest_client.get(
+            reverse('posts:index')
+            + f'?cursor={second_page.previous_cursor}'
+        )
+        self.assertEqual(
+            list(back.context['page_obj']), list(first_page))
+        self.assertFalse(back.context['page_obj'].has_previous())
+        ids = [post.id for post in list(first_page) + list(second_page)]
+        self.assertEqual(len(set(ids)), 13)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Некорректный курсор открывает первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=broken'
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_deep_legacy_page_shows_first_page(self):
+        """Слишком далёкий ?page=N открывает первую страницу без OFFSET"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:index') + f'?page={MAX_LEGACY_PAGE + 1}')
+        self.assertEqual(response.context['page_obj'].number, 1)
+        for query in queries:
+            self.assertNotIn('OFFSET', query['sql'].upper())
+
+    def test_paginator_does_not_count(self):
+        """Пагинация не выполняет COUNT по ленте"""
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(
+                reverse('posts:group_list',
+                        kwargs={'slug': PaginatorTest.group.slug})
+                + '?page=2'
+            )
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_pagination_window(self):
+        """Пагинатор выводит первую, соседние и текущую страницы"""
+        paginator = KeysetPaginator(Post.objects.all(), 2)
+        page = paginator.restore((list(Post.objects.all()[:2]), 6, True))
+        window = pagination_window(page)
+        self.assertEqual(
+            [item['number'] for item in window],
+            [1, None, 5, 6, 7, None],
+        )
+        self.assertNotIn('cursor', window[0])
+        self.assertEqual(window[2]['cursor'], page.previous_cursor)
+        self.assertEqual(window[4]['cursor'], page.next_cursor)
+        response = self.guest_client.get(
+            reverse('posts:index') + '?page=2')
+        self.assertContains(response, '>1</a>')
+        self.assertNotContains(response, '…')
+        self.assertNotContains(response, 'page=')
@@ -0,0 +1,139 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import purge
+from ..forms import PostForm
+from .utils import run_on_commit
+from ..models import (
+    Comment, Follow, Group, Post, PurgeJob, TimelineEntry, UserStats
+)
+
+User = get_user_model()
+
+
+class PurgeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='prolific')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='purged', description='Описание')
+        Follow.objects.create(user=self.reader, author=self.author)
+        for number in range(5):
+            post = Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {number}')
+            Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий')
+        self.kept = Post.objects.create(author=self.reader, text='Свой')
+        Comment.objects.create(
+            post=self.kept, author=self.author, text='Чужой комментарий')
+
+    def test_purge_user(self):
+        """Пользователь блокируется сразу, а связи удаляются пачками"""
+        job = purge.schedule(self.author)
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.is_active)
+        self.assertEqual(job.state, PurgeJob.PENDING)
+        self.assertTrue(purge.run(job.pk, chunk_size=2))
+        job.refresh_from_db()
+        self.assertEqual(job.state, PurgeJob.DONE)
+        self.assertEqual(job.done, job.total)
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertEqual(list(Post.objects.all()), [self.kept])
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        stats = UserStats.objects.get(user=self.reader)
+        self.assertEqual(stats.following_count, 0)
+        self.assertEqual(stats.comments_count, 0)
+
+    def test_purge_group(self):
+        """Группа скрывается сразу, посты остаются без группы"""
+        job = purge.schedule(self.group)
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.group.slug)
+        self.assertTrue(purge.run(job.pk, chunk_size=2))
+        self.assertFalse(Group.objects.exists())
+        self.assertEqual(Post.objects.filter(group=None).count(), 6)
+
+    def test_admin_delete(self):
+        """Удаление в админке ставит задание и показывает прогресс"""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        self.client.post(
+            reverse('admin:posts_group_delete', args=[self.group.pk]),
+            {'post': 'yes'},
+        )
+        self.group.refresh_from_db()
+        self.assertFalse(self.group.is_active)
+        job = PurgeJob.objects.get(kind=PurgeJob.GROUP)
+        purge.run(job.pk)
+        response = self.client.get(
+            reverse('admin:posts_purgejob_changelist'))
+        self.assertContains(response, '5 из 5 (100%)')
+
+    def test_admin_delete_summary(self):
+        """Подтверждение удаления показывает счётчики, а не все посты"""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:auth_user_delete', args=[self.author.pk]))
+        self.assertContains(response, 'Посты: 5')
+        self.assertNotContains(response, 'Пост 0')
+
+    def test_resume_skips_running(self):
+        """Продолжить можно только остановившееся задание"""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        job = PurgeJob.objects.create(
+            kind=PurgeJob.USER, object_id=self.author.pk,
+            label=self.author.username, state=PurgeJob.RUNNING)
+        resume = {'action': 'resume', '_selected_action': [job.pk]}
+        url = reverse('admin:posts_purgejob_changelist')
+        with run_on_commit():
+            self.client.post(url, resume)
+        self.assertTrue(Post.objects.filter(author=self.author).exists())
+        PurgeJob.objects.filter(pk=job.pk).update(state=PurgeJob.FAILED)
+        with run_on_commit():
+            self.client.post(url, resume)
+        self.assertFalse(Post.objects.filter(author=self.author).exists())
+
+    def test_deactivated_user_hidden(self):
+        """Заблокированный автор не открывается и на него нельзя
+        подписаться"""
+        profile = reverse(
+            'posts:profile', kwargs={'username': self.author.username})
+        self.assertEqual(self.client.get(profile).status_code, 200)
+        post = Post.objects.filter(author=self.author).first()
+        detail = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        purge.schedule(self.author)
+        self.assertEqual(self.client.get(profile).status_code, 404)
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']), [self.kept])
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.kept.pk}))
+        self.assertNotContains(response, 'Чужой комментарий')
+        self.client.force_login(User.objects.create_user(username='late'))
+        self.client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+        self.assertFalse(Follow.objects.filter(
+            user__username='late').exists())
+
+    def test_form_keeps_current_group(self):
+        """Пост можно сохранить, пока его группа удаляется"""
+        purge.schedule(self.group)
+        post = Post.objects.filter(group=self.group).first()
+        form = PostForm(
+            {'text': 'Правка', 'group': self.group.pk}, instance=post)
+        self.assertTrue(form.is_valid())
+        self.assertFalse(PostForm({
+            'text': 'Новый', 'group': self.group.pk}).is_valid())
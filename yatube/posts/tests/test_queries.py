@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from ..management.commands.check_query_plans import view_queries
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='budget',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Первый пост',
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': cls.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+            reverse('posts:comments', kwargs={'post_id': cls.post.id}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=пост',
+            reverse('posts:post_create'),
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(QueryBudgetTest.reader)
+        cache.clear()
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def fill_page(self):
+        for number in range(9):
+            post = Post.objects.create(
+                author=QueryBudgetTest.author,
+                text=f'Пост {number}',
+                group=QueryBudgetTest.group,
+            )
+            Comment.objects.create(
+                post=QueryBudgetTest.post,
+                author=QueryBudgetTest.reader if number % 2 else post.author,
+                text=f'Комментарий {number}',
+            )
+
+    def test_views_fit_query_budget(self):
+        """Страницы укладываются в объявленный бюджет запросов"""
+        self.fill_page()
+        for url in QueryBudgetTest.urls:
+            with self.subTest(url=url):
+                budget = resolve(url.split('?')[0]).func.query_budget
+                self.assertLessEqual(self.count_queries(url), budget)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов не растёт вместе с числом постов на странице"""
+        before = {
+            url: self.count_queries(url) for url in QueryBudgetTest.urls
+        }
+        self.fill_page()
+        for url in QueryBudgetTest.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+
+class QueryPlanTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не сортируют во временном B-дереве"""
+        output = StringIO()
+        call_command('check_query_plans', stdout=output)
+        self.assertNotIn('TEMP B-TREE', output.getvalue())
+
+    def test_feed_queries_use_expected_index(self):
+        """Каждый запрос ленты идёт по своему индексу"""
+        for key in (None, (timezone.now(), 0)):
+            for name, (queryset, index) in view_queries(key).items():
+                with self.subTest(name=name, key=key):
+                    self.assertIn(f'INDEX {index}', queryset.explain())
@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Кот <b>сидит</b> на окне и смотрит на голубей',
+        )
+        Post.objects.create(author=cls.user, text='Собака спит во дворе')
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.id for post in response.context['page_obj']]
+
+    def test_search_finds_and_highlights(self):
+        """Поиск находит пост и подсвечивает совпадение"""
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual([post.id for post in page_obj], [self.post.id])
+        self.assertIn('<mark>Кот</mark>', page_obj[0].snippet)
+        self.assertIn('&lt;b&gt;', page_obj[0].snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        post = Post.objects.create(
+            author=SearchTest.user, text='Ромашки в поле')
+        self.assertEqual(self.found('ромашки'), [post.id])
+        post.text = 'Васильки в поле'
+        post.save()
+        self.assertEqual(self.found('ромашки'), [])
+        self.assertEqual(self.found('васильки'), [post.id])
+        post.delete()
+        self.assertEqual(self.found('васильки'), [])
+
+    def test_search_pages_by_cursor(self):
+        """Результаты поиска листаются курсором"""
+        Post.objects.bulk_create(
+            Post(author=SearchTest.user, text=f'Осень номер {number}')
+            for number in range(12)
+        )
+        response = self.client.get(reverse('posts:search'), {'q': 'осень'})
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        response = self.client.get(
+            reverse('posts:search'),
+            {'q': 'осень', 'cursor': first_page.next_cursor},
+        )
+        second_page = response.context['page_obj']
+        ids = {post.id for post in list(first_page) + list(second_page)}
+        self.assertEqual(len(ids), 12)
+
+    def test_query_syntax_is_escaped(self):
+        """Служебные символы FTS5 в запросе не ломают поиск"""
+        self.assertEqual(self.found('"кот AND ('), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс"""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_rebuild_search_index_command(self):
+        """rebuild_search_index восстанавливает индекс"""
+        with connection.cursor() as cursor:
+            cursor.execute(search.COMMAND, ['delete-all'])
+        self.assertEqual(self.found('кот'), [])
+        call_command(
+            'rebuild_search_index', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(self.found('кот'), [SearchTest.post.id])
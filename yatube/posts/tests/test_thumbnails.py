@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from .. import thumbnails, variants
+from ..models import ImageVariant, Post
+from .utils import run_on_commit
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='artist')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Файлы и записи кэша не откатываются вместе с транзакцией теста.
+        cache.clear()
+        shutil.rmtree(
+            os.path.join(TEMP_MEDIA_ROOT, 'cache'), ignore_errors=True)
+
+    def test_generate_thumbnails_command(self):
+        """generate_thumbnails создаёт миниатюры для всех картинок"""
+        post = Post.objects.create(
+            author=ThumbnailsTest.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        Post.objects.create(
+            author=ThumbnailsTest.user,
+            text='Та же картинка',
+            image=SimpleUploadedFile(
+                'copy.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        self.assertEqual(self.thumbnail_files(), [])
+        output = StringIO()
+        call_command(
+            'generate_thumbnails', '--processes', '1', stdout=output)
+        self.assertIn('картинок: 1', output.getvalue())
+        created = self.thumbnail_files()
+        self.assertEqual(len(created), len(thumbnails.PRESETS))
+        call_command(
+            'generate_thumbnails', '--processes', '1', '--force',
+            stdout=StringIO())
+        self.assertEqual(self.thumbnail_files(), created)
+        self.assertIsNotNone(
+            default.kvstore.get(ImageFile(post.image)))
+
+    def test_post_create_schedules_thumbnails(self):
+        """Новый пост с картинкой получает миниатюры после коммита"""
+        self.client.force_login(ThumbnailsTest.user)
+        with run_on_commit():
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, content_type='image/gif'),
+            })
+            self.assertEqual(self.thumbnail_files(), [])
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual(
+            len(self.thumbnail_files()), len(thumbnails.PRESETS))
+        self.assertIsNotNone(default.kvstore.get(ImageFile(post.image)))
+
+    def test_prefetch_page_thumbnails(self):
+        """Миниатюры страницы находятся одним запросом к кэшу"""
+        post = Post.objects.create(
+            author=ThumbnailsTest.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        Post.objects.create(author=ThumbnailsTest.user, text='Без картинки')
+        thumbnails.generate(post.image.name)
+        posts = list(Post.objects.order_by('id'))
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts)
+        geometry, options = thumbnails.PRESETS['feed']
+        self.assertEqual(
+            posts[0].thumbnails['feed'].name,
+            get_thumbnail(post.image, geometry, **options).name)
+        self.assertEqual(posts[1].thumbnails, {})
+        thumbnails.forget(post.image.name)
+        thumbnails.prefetch(posts)
+        self.assertEqual(posts[0].thumbnails, {})
+
+    def test_image_variants(self):
+        """Ленты выводят srcset из вариантов картинки разных форматов"""
+        post = Post.objects.create(
+            author=ThumbnailsTest.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        thumbnails.generate(post.image.name)
+        formats = set(ImageVariant.objects.filter(
+            source=post.image.name).values_list('format', flat=True))
+        self.assertEqual(formats, {
+            name for name, *rest in variants.supported_formats()})
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f'{variants.WIDTHS[0]}w')
+        output = StringIO()
+        call_command('image_variant_stats', stdout=output)
+        self.assertIn('webp: вариантов 1', output.getvalue())
+
+    def test_variants_refresh_cached_article(self):
+        """Пост, показанный до вариантов, получает srcset после них"""
+        post = Post.objects.create(
+            author=ThumbnailsTest.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'type="image/webp"')
+        with run_on_commit():
+            variants.generate(post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+
+    def thumbnail_files(self):
+        found = []
+        for root, dirs, files in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'cache')):
+            found += [os.path.join(root, name) for name in files]
+        return sorted(found)
@@ -0,0 +1,218 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.core.management.base import SystemCheckError
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import search, transfer
+from ..models import (
+    Comment, Follow, Group, ImportCheckpoint, ImportedId, Post
+)
+
+User = get_user_model()
+RECORDS = [
+    {'type': 'user', 'username': 'writer', 'first_name': 'Лев'},
+    {'type': 'user', 'username': 'reader'},
+    {'type': 'group', 'slug': 'imported', 'title': 'Из архива'},
+    {'type': 'post', 'id': 1, 'author': 'writer', 'group': 'imported',
+     'text': 'Первый', 'pub_date': '2020-01-02T03:04:05'},
+    {'type': 'post', 'id': 2, 'author': 'writer', 'group': None,
+     'text': 'Второй', 'pub_date': '2020-01-03T03:04:05'},
+    {'type': 'comment', 'id': 1, 'post': 1, 'author': 'reader',
+     'text': 'Отлично', 'created': '2020-01-04T00:00:00'},
+    {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+    {'type': 'post', 'id': 3, 'author': 'ghost', 'text': 'Ничей',
+     'pub_date': '2020-01-05T00:00:00'},
+]
+
+
+class ImportTest(TestCase):
+    def setUp(self):
+        self.existing = User.objects.create_user(username='writer')
+        Post.objects.create(author=self.existing, text='Уже был')
+        handle, self.path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, lines):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    def run_import(self):
+        output = StringIO()
+        call_command(
+            'import_yatube', self.path, '--chunk-size', '3',
+            stdout=output)
+        return output.getvalue()
+
+    def test_import(self):
+        """Импорт создаёт записи, сохраняет даты и пересчитывает счётчики"""
+        self.write([json.dumps(record) for record in RECORDS])
+        output = self.run_import()
+        self.assertIn('пропущено записей 1', output)
+        writer = User.objects.get(username='writer')
+        self.assertEqual(writer.pk, self.existing.pk)
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.pub_date, datetime(2020, 1, 2, 3, 4, 5))
+        self.assertEqual(first.group, Group.objects.get(slug='imported'))
+        self.assertEqual(first.comments_count, 1)
+        self.assertEqual(
+            Comment.objects.get().created, datetime(2020, 1, 4))
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author=writer).exists())
+        self.assertEqual(writer.stats.posts_count, 3)
+        self.assertEqual(writer.stats.followers_count, 1)
+        self.assertIn('уже завершён', self.run_import())
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_resume(self):
+        """Прерванный импорт продолжается с последней загруженной пачки"""
+        lines = [json.dumps(record) for record in RECORDS]
+        self.write(lines[:4] + ['{broken'] + lines[5:])
+        with self.assertRaises(ValueError):
+            self.run_import()
+        self.assertEqual(ImportCheckpoint.objects.get().lines, 3)
+        self.write(lines)
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertTrue(ImportCheckpoint.objects.get().finished)
+
+    def test_resume_after_site_posts(self):
+        """Посты, созданные на сайте между запусками, не занимают id
+        импортируемых"""
+        records = RECORDS[:5] + [
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {'type': 'post', 'id': 3, 'author': 'writer', 'text': 'Третий',
+             'pub_date': '2020-01-05T00:00:00'},
+            {'type': 'comment', 'id': 1, 'post': 3, 'author': 'reader',
+             'text': 'К третьему', 'created': '2020-01-06T00:00:00'},
+        ]
+        lines = [json.dumps(record) for record in records]
+        self.write(lines[:6] + ['{broken'] + lines[6:])
+        with self.assertRaises(ValueError):
+            self.run_import()
+        self.assertEqual(Post.objects.count(), 3)
+        site = Post.objects.create(author=self.existing, text='С сайта')
+        self.write(lines[:6] + [''] + lines[6:])
+        self.run_import()
+        self.assertEqual(Post.objects.get(pk=site.pk).text, 'С сайта')
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(
+            Comment.objects.get().post, Post.objects.get(text='Третий'))
+
+    def test_stdin_requires_source(self):
+        """Для stdin имя контрольной точки обязательно"""
+        with self.assertRaises(CommandError):
+            call_command('import_yatube', '-', stdout=StringIO())
+
+    def test_killed_import_restores_triggers(self):
+        """Триггеры, снятые убитым импортом, возвращает следующий импорт,
+        а до того о них предупреждает проверка"""
+        ImportCheckpoint.objects.create(source='killed', triggers_dropped=True)
+        search.drop_triggers()
+        post = Post.objects.create(author=self.existing, text='Енот')
+        with self.assertRaises(SystemCheckError):
+            call_command(
+                'check', '--tag', 'database', '--fail-level', 'WARNING',
+                stdout=StringIO(), stderr=StringIO())
+        self.write([json.dumps(RECORDS[0])])
+        self.run_import()
+        self.assertFalse(ImportCheckpoint.objects.filter(
+            triggers_dropped=True).exists())
+        self.assertEqual(search.SearchFeed('енот').slice(0, 5), [post])
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.old = Post.objects.create(author=cls.author, text='Старый')
+        Post.objects.filter(pk=cls.old.pk).update(
+            updated_at=datetime(2000, 1, 1))
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Новый')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+
+    def records(self, data):
+        return [json.loads(line) for line in data.decode().splitlines()]
+
+    def test_export_command(self):
+        """export_yatube пишет NDJSON в gzip, который понимает импорт"""
+        handle, path = tempfile.mkstemp(suffix='.ndjson.gz')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_yatube', path, '--batch-size', '1',
+                     '--since', '2010-01-01', stdout=StringIO())
+        with gzip.open(path) as file:
+            records = self.records(file.read())
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['origin', 'user', 'group', 'post', 'comment'])
+        self.assertEqual(records[0]['origin'], transfer.export_origin())
+        post = records[3]
+        self.assertEqual(post['id'], ExportTest.post.id)
+        self.assertEqual(post['author'], 'author')
+        self.assertEqual(post['group'], 'group')
+        self.assertEqual(records[4]['post'], ExportTest.post.id)
+
+    def test_admin_export(self):
+        """Выгрузку из админки может скачать только суперпользователь"""
+        url = reverse('admin:posts_post_export')
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+        response = self.client.get(url, {'gzip': '1'})
+        self.assertTrue(response.streaming)
+        records = self.records(
+            gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(
+            sum(record['type'] == 'post' for record in records), 2)
+
+
+class RoundTripTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Черновик')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Первый')
+
+    def transfer(self, source, since=None):
+        lines = ''.join(transfer.export_records(since)).splitlines()
+        transfer.import_records(lines, source)
+
+    def copy(self):
+        return Post.objects.get(pk=ImportedId.objects.get(
+            kind=ImportedId.POST, source_id=self.post.pk).target_id)
+
+    def test_incremental_export(self):
+        """Инкрементная выгрузка обновляет загруженный пост и добавляет
+        к нему новые комментарии без дублей"""
+        self.transfer('full')
+        self.assertEqual(Post.objects.count(), 2)
+        since = datetime.now()
+        self.post.text = 'Исправлено'
+        self.post.save()
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Второй')
+        self.transfer('since', since)
+        self.assertEqual(Post.objects.count(), 2)
+        copy = self.copy()
+        self.assertEqual(copy.text, 'Исправлено')
+        self.assertEqual(
+            list(copy.comments.order_by('created').values_list(
+                'text', flat=True)),
+            ['Первый', 'Второй'])
+        self.assertEqual(copy.comments_count, 2)
@@ -1,15 +1,21 @@
+import hashlib
 import shutil
 import tempfile
+import time
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 from django import forms
+from .. import caching, fragments
 from ..models import Post, Group, Comment, Follow
 from ..forms import PostForm
+from .utils import run_on_commit
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -283,6 +289,8 @@ class CacheTest(TestCase):
         )
 
     def setUp(self):
+        caching.flush_page_stats()
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(CacheTest.user)
 
@@ -296,14 +304,172 @@ class CacheTest(TestCase):
         )
         response1 = self.authorized_client.get(
             reverse('posts:index'))
-        self.post_del = Post.objects.get(id=1).delete()
-        response2 = self.authorized_client.get(
-            reverse('posts:index'))
-        self.assertEqual(response1.content, response2.content)
-        cache.clear()
+        guest_client = Client()
+        with self.assertNumQueries(0):
+            response2 = guest_client.get(reverse('posts:index'))
+        self.assertEqual(
+            list(response1.context['page_obj']),
+            list(response2.context['page_obj']))
+        with run_on_commit():
+            self.post_del = Post.objects.get(id=1).delete()
         response3 = self.authorized_client.get(
             reverse('posts:index'))
-        self.assertNotEqual(response3.content, response2.content)
+        self.assertNotEqual(response3.content, response1.content)
+        self.assertEqual(len(response3.context['page_obj']), 0)
+
+    def test_cache_invalidated_by_group_change(self):
+        """Переименование группы сбрасывает кэш index"""
+        Post.objects.create(
+            author=CacheTest.user,
+            text='Текст',
+            group=CacheTest.group,
+        )
+        self.authorized_client.get(reverse('posts:index'))
+        group = Group.objects.get(slug='slug-cache')
+        group.title = 'Новое название'
+        with run_on_commit():
+            group.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое название')
+
+    def test_admin_regrouping_invalidates_both_groups(self):
+        """Перенос поста в другую группу в админке сбрасывает обе ленты"""
+        other = Group.objects.create(
+            title='Другая группа', slug='slug-other', description='Описание')
+        post = Post.objects.create(
+            author=CacheTest.user, text='Текст', group=CacheTest.group)
+        old_url = reverse('posts:group_list', kwargs={'slug': 'slug-cache'})
+        new_url = reverse('posts:group_list', kwargs={'slug': 'slug-other'})
+        self.authorized_client.get(old_url)
+        self.authorized_client.get(new_url)
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='password')
+        admin_client = Client()
+        admin_client.force_login(admin)
+        with run_on_commit():
+            admin_client.post(reverse('admin:posts_post_changelist'), {
+                'form-TOTAL_FORMS': '1',
+                'form-INITIAL_FORMS': '1',
+                'form-MIN_NUM_FORMS': '0',
+                'form-MAX_NUM_FORMS': '1000',
+                'form-0-id': post.id,
+                'form-0-group': other.id,
+                '_save': 'Сохранить',
+            })
+        guest_client = Client()
+        response = guest_client.get(old_url)
+        self.assertEqual(len(response.context['page_obj']), 0)
+        response = guest_client.get(new_url)
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_profile_cache_follows_author_change(self):
+        """Изменение профиля автора сбрасывает кэш его страницы"""
+        Post.objects.create(author=CacheTest.user, text='Текст')
+        url = reverse('posts:profile', kwargs={'username': 'account'})
+        self.authorized_client.get(url)
+        author = User.objects.get(username='account')
+        author.first_name = 'Лев'
+        with run_on_commit():
+            author.save()
+        response = Client().get(url)
+        self.assertEqual(
+            response.context['page_obj'][0].author.first_name, 'Лев')
+
+    def test_post_article_fragments(self):
+        """Фрагменты постов берутся из кэша и обновляются после правки"""
+        post = Post.objects.create(
+            author=CacheTest.user, text='Старый текст',
+            group=CacheTest.group)
+        self.authorized_client.get(reverse('posts:index'))
+        key = fragments.article_key(post)
+        self.assertIn('Старый текст', cache.get(key))
+        cache.set(key, 'Из кэша')
+        response = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'slug-cache'}))
+        self.assertContains(response, 'Из кэша')
+        post.text = 'Новый текст'
+        with run_on_commit():
+            post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый текст')
+
+    def test_stale_page_served_while_refreshing(self):
+        """Пока страницу пересчитывает другой запрос, отдаётся старая копия"""
+        Post.objects.create(author=CacheTest.user, text='Первый пост')
+        guest_client = Client()
+        url = reverse('posts:index')
+        etag = guest_client.get(url)['ETag']
+        with run_on_commit():
+            Post.objects.create(author=CacheTest.user, text='Второй пост')
+        params = hashlib.md5('None|None'.encode()).hexdigest()
+        cache.add(caching.LEASE_KEY.format(caching.INDEX, params), True)
+        response = guest_client.get(url)
+        self.assertNotContains(response, 'Второй пост')
+        self.assertFalse(response.has_header('ETag'))
+        response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        cache.delete(caching.LEASE_KEY.format(caching.INDEX, params))
+        self.assertContains(guest_client.get(url), 'Второй пост')
+        stats = caching.page_stats('posts:index')
+        self.assertEqual(stats[caching.STALE], 2)
+        self.assertEqual(stats[caching.MISS], 2)
+
+    def test_generation_bumped_after_commit(self):
+        """Поколение ленты сбрасывается только после коммита"""
+        before = caching.generation(caching.INDEX)
+        with run_on_commit():
+            Post.objects.create(author=CacheTest.user, text='Текст')
+            self.assertEqual(caching.generation(caching.INDEX), before)
+        self.assertGreater(caching.generation(caching.INDEX), before)
+
+    def test_page_stats_are_buffered(self):
+        """Счётчики страниц попадают в кэш пачкой, а не на каждый запрос"""
+        for _ in range(3):
+            caching._count('posts:index', caching.HIT)
+        self.assertIsNone(cache.get(
+            caching.PAGE_STATS_KEY.format('posts:index', caching.HIT)))
+        self.assertEqual(caching.page_stats('posts:index')[caching.HIT], 3)
+
+
+class ReadYourWritesTest(TransactionTestCase):
+    """Без обёртки TestCase: bump_on_commit срабатывает на настоящем
+    коммите, как в запросе.
+    """
+
+    def setUp(self):
+        caching.flush_page_stats()
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.client.force_login(self.user)
+
+    def written(self):
+        return self.client.session.get(
+            caching.WRITTEN_SESSION_KEY.format(caching.INDEX))
+
+    def test_author_reads_own_write(self):
+        """Автор сразу видит свой пост, даже если кэш поколения отстал"""
+        self.client.get(reverse('posts:index'))
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Свежий пост'})
+        self.assertEqual(self.written(), caching.generation(caching.INDEX))
+        stale = caching.generation(caching.INDEX) - 1
+        cache.set(caching.GENERATION_KEY.format(caching.INDEX), stale)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'Свежий пост')
+
+    def test_write_does_not_bypass_cache(self):
+        """После поста автор снова читает общий кэш"""
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Свежий пост'})
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        stats = caching.page_stats('posts:index')
+        self.assertEqual(stats[caching.BYPASS], 0)
+        self.assertEqual(stats[caching.MISS], 1)
+        self.assertEqual(stats[caching.HIT], 1)
+        self.assertIsNone(self.written())
 
 
 class FollowTest(TestCase):
@@ -404,3 +570,146 @@ class FollowTest(TestCase):
         self.assertEqual(len(
             response_unfollow_index.context['page_obj']),
             page_unfollow)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(
+            author=CommentsPaginationTest.user,
+            text='Обсуждаемый пост',
+        )
+        Comment.objects.bulk_create(
+            Comment(
+                post=CommentsPaginationTest.post,
+                author=CommentsPaginationTest.user,
+                text=f'Комментарий {number}',
+            )
+            for number in range(25)
+        )
+
+    def test_post_detail_renders_first_comments_page(self):
+        """post_detail показывает только первую страницу комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail',
+                    kwargs={'post_id': CommentsPaginationTest.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, comments.next_cursor)
+
+    def test_comments_fragment_returns_next_page(self):
+        """Фрагмент комментариев отдаёт следующую страницу"""
+        response = self.client.get(
+            reverse('posts:post_detail',
+                    kwargs={'post_id': CommentsPaginationTest.post.id}))
+        cursor = response.context['comments'].next_cursor
+        response = self.client.get(
+            reverse('posts:comments',
+                    kwargs={'post_id': CommentsPaginationTest.post.id}),
+            {'cursor': cursor},
+        )
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_comments_fragment_rejects_bad_requests(self):
+        """Фрагмент: неизвестный пост — 404, испорченный курсор — 400"""
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('posts:comments',
+                    kwargs={'post_id': CommentsPaginationTest.post.id}),
+            {'cursor': 'broken'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='poller')
+        cls.reader = User.objects.create_user(username='watcher')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ConditionalGetTest.reader)
+
+    def revalidate(self, url):
+        response = self.client.get(url)
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_page_is_not_modified(self):
+        """Неизменённая страница отвечает 304 без запроса ленты"""
+        url = reverse('posts:index')
+        cache.set(
+            caching.MODIFIED_KEY.format(caching.INDEX), time.time() - 60, None)
+        response = Client().get(url)
+        with self.assertNumQueries(0):
+            response = Client().get(
+                url,
+                HTTP_IF_NONE_MATCH=response['ETag'],
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+            )
+        self.assertEqual(response.status_code, 304)
+        response = Client().get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_reset_validators(self):
+        """Новые комментарии и подписки меняют ETag страниц"""
+        detail_url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': ConditionalGetTest.post.id})
+        profile_url = reverse(
+            'posts:profile', kwargs={'username': 'poller'})
+        for url in (detail_url, profile_url):
+            self.assertEqual(self.revalidate(url).status_code, 304)
+        detail = self.client.get(detail_url)
+        profile = self.client.get(profile_url)
+        with run_on_commit():
+            Comment.objects.create(
+                post=ConditionalGetTest.post,
+                author=ConditionalGetTest.reader,
+                text='Комментарий',
+            )
+            Follow.objects.create(
+                user=ConditionalGetTest.reader,
+                author=ConditionalGetTest.author)
+        for url, response in ((detail_url, detail), (profile_url, profile)):
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 200)
+
+    def test_commenter_rename_resets_detail(self):
+        """Правка профиля комментатора меняет ETag страницы поста"""
+        Comment.objects.create(
+            post=ConditionalGetTest.post,
+            author=ConditionalGetTest.reader,
+            text='Комментарий',
+        )
+        url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': ConditionalGetTest.post.id})
+        response = self.client.get(url)
+        with run_on_commit():
+            reader = User.objects.get(pk=ConditionalGetTest.reader.pk)
+            reader.username = 'renamed'
+            reader.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, 'renamed')
+
+    def test_validator_depends_on_user(self):
+        """Разные пользователи не получают 304 на чужую версию страницы"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        response = Client().get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,21 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def run_on_commit():
+    """Выполняет колбэки transaction.on_commit, отложенные в блоке.
+
+    TestCase не коммитит транзакцию, поэтому без этого сброс кэша после
+    коммита в тестах не произойдёт (аналог captureOnCommitCallbacks
+    из Django 3.2).
+    """
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+    for sids, callback in callbacks:
+        callback()
@@ -0,0 +1,106 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from . import variants
+from .storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+# Должны совпадать с аргументами {% thumbnail %} в шаблонах: по ним
+# sorl-thumbnail строит ключ, и шаблон найдёт готовую миниатюру.
+PRESETS = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+CACHED_DB_KVSTORE = 'sorl.thumbnail.kvstores.cached_db_kvstore.KVStore'
+THUMBNAIL_KEY = 'posts:thumbnail:{}:{}'
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def _source(name):
+    # Хранилище входит в ключ sorl-thumbnail: шаблон передаёт
+    # post.image, поэтому и здесь источник из хранилища поля.
+    return ImageFile(name, content_storage)
+
+
+def generate(name, force=False):
+    """Создаёт миниатюры всех пресетов и варианты картинки из хранилища.
+
+    С force удаляет уже созданные миниатюры и строит их заново.
+    """
+    if force:
+        default.kvstore.delete_thumbnails(_source(name))
+    # Имена готовых миниатюр запоминаются для prefetch: так не нужно
+    # повторять, как sorl-thumbnail строит имя файла.
+    cache.set_many({
+        THUMBNAIL_KEY.format(preset, name): get_thumbnail(
+            _source(name), geometry, **options).name
+        for preset, (geometry, options) in PRESETS.items()
+    }, None)
+    variants.generate(name, force)
+    return name
+
+
+def forget(name):
+    """Забывает имена миниатюр удалённой картинки."""
+    cache.delete_many(
+        [THUMBNAIL_KEY.format(preset, name) for preset in PRESETS])
+
+
+def _generate_in_worker(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        # У потока своё соединение с БД, его никто больше не закроет.
+        connection.close()
+
+
+def schedule(name):
+    """Ставит создание миниатюр в фоновый поток после коммита."""
+    if not name:
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate(name))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_generate_in_worker, name))
+
+
+def prefetch(posts):
+    """Находит готовые миниатюры всех пресетов для постов одним get_many.
+
+    Найденные кладёт в post.thumbnails[пресет]; миниатюры, созданные
+    не через generate, шаблон достанет тегом {% thumbnail %} как обычно.
+    """
+    wanted = {}
+    for post in posts:
+        post.thumbnails = {}
+        if not post.image:
+            continue
+        for preset in PRESETS:
+            key = THUMBNAIL_KEY.format(preset, post.image.name)
+            wanted[key] = (post, preset)
+    if not wanted:
+        return
+    for key, thumbnail in cache.get_many(list(wanted)).items():
+        post, preset = wanted[key]
+        post.thumbnails[preset] = ImageFile(thumbnail, default.storage)
@@ -0,0 +1,478 @@
+import gzip
+import json
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.utils.crypto import salted_hmac
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import caching, counters, feeds, search
+from .models import (
+    Comment, Follow, Group, ImportCheckpoint, ImportedId, Post, User
+)
+from .utils import batches
+
+IMPORT_CHUNK_SIZE = 10000
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 2000
+# Порядок внутри пачки: посты ссылаются на авторов и группы,
+# комментарии — на посты. origin — заголовок выгрузки.
+RECORD_TYPES = ('origin', 'user', 'group', 'post', 'comment', 'follow')
+TIMESTAMP_FIELDS = (
+    (Post, 'pub_date'),
+    (Post, 'updated_at'),
+    (Comment, 'created'),
+)
+
+
+def open_input(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+@contextmanager
+def _keep_timestamps():
+    """Без этого bulk_create заменит даты из файла текущим временем."""
+    fields = [model._meta.get_field(name) for model, name in TIMESTAMP_FIELDS]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def _datetime(value):
+    value = parse_datetime(value)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        value = timezone.make_naive(value)
+    return value
+
+
+def _max_id(model):
+    return model.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def export_origin():
+    """Имя этого сайта в выгрузках: EXPORT_ORIGIN или хеш SECRET_KEY."""
+    return settings.EXPORT_ORIGIN or salted_hmac(
+        'posts.transfer.export_origin', '').hexdigest()[:16]
+
+
+def get_checkpoint(source, origin=None):
+    with transaction.atomic():
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(
+            source=source)
+        if origin and not checkpoint.origin:
+            checkpoint.origin = origin
+            checkpoint.save(update_fields=['origin', 'updated_at'])
+    return checkpoint
+
+
+def restore_search(checkpoints=None):
+    """Возвращает триггеры поиска и пересобирает индекс, если импорт
+    был убит, пока они были сняты. Возвращает, понадобилось ли это.
+    """
+    if checkpoints is None:
+        checkpoints = ImportCheckpoint.objects.all()
+    checkpoints = checkpoints.filter(triggers_dropped=True)
+    if not checkpoints.exists():
+        return False
+    search.create_triggers()
+    if search.is_supported():
+        search.rebuild_index()
+    checkpoints.update(triggers_dropped=False)
+    return True
+
+
+class Importer:
+    """Загружает записи NDJSON пачками через bulk_create.
+
+    Авторы и группы ищутся по username и slug в словарях в памяти;
+    недостающие создаются. Посты и комментарии получают новые id,
+    соответствие id из файла хранится в ImportedId для каждого сайта:
+    уже загруженный пост обновляется, комментарий пропускается, поэтому
+    инкрементные выгрузки не дублируют записи. Поисковый индекс, счётчики
+    и ленты пересчитываются один раз в finish.
+    """
+
+    def __init__(self, checkpoint, batch_size=IMPORT_BATCH_SIZE):
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.scopes = {caching.INDEX}
+        self.skipped = 0
+
+    def _create_missing(self, model, ids, key, records, build):
+        new = {
+            record[key]: record for record in records
+            if record[key] not in ids
+        }
+        if not new:
+            return
+        model.objects.bulk_create(
+            [build(record) for record in new.values()],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        ids.update(model.objects.filter(
+            **{f'{key}__in': list(new)}).values_list(key, 'pk'))
+
+    def _users(self, records):
+        self._create_missing(
+            User, self.users, 'username', records,
+            lambda record: User(
+                username=record['username'],
+                first_name=record.get('first_name', ''),
+                last_name=record.get('last_name', ''),
+                password=make_password(None),
+            ),
+        )
+
+    def _groups(self, records):
+        self._create_missing(
+            Group, self.groups, 'slug', records,
+            lambda record: Group(
+                slug=record['slug'],
+                title=record['title'],
+                description=record.get('description', ''),
+            ),
+        )
+
+    @property
+    def origin(self):
+        return self.checkpoint.origin or self.checkpoint.source
+
+    def _mapped(self, kind, source_ids):
+        return dict(ImportedId.objects.filter(
+            origin=self.origin, kind=kind, source_id__in=source_ids,
+        ).values_list('source_id', 'target_id'))
+
+    def _assign(self, model, kind, source_ids):
+        """Новые id подряд после последнего занятого и их соответствие
+        id из файла.
+        """
+        first = _max_id(model) + 1
+        ids = {
+            source_id: first + number
+            for number, source_id in enumerate(source_ids)
+        }
+        ImportedId.objects.bulk_create(
+            [
+                ImportedId(
+                    origin=self.origin, kind=kind,
+                    source_id=source_id, target_id=target_id)
+                for source_id, target_id in ids.items()
+            ],
+            batch_size=self.batch_size,
+        )
+        return ids
+
+    def _new(self, kind, records):
+        """Записи, которых ещё нет в соответствии, без повторов по id."""
+        records = {record['id']: record for record in records}
+        mapped = self._mapped(kind, list(records))
+        return [
+            record for source_id, record in records.items()
+            if source_id not in mapped
+        ]
+
+    def _fill(self, post, record):
+        post.group_id = self.groups.get(record.get('group'))
+        post.text = record['text']
+        post.image = record.get('image') or ''
+        post.updated_at = _datetime(
+            record.get('updated_at') or record['pub_date'])
+        self.scopes.add(caching.author_scope(post.author_id))
+        if post.group_id is not None:
+            self.scopes.add(caching.group_scope(post.group_id))
+
+    def _changed(self, records, mapped):
+        """Уже загруженные посты с полями из новой выгрузки."""
+        posts = Post.objects.only('author', 'group').in_bulk(
+            [mapped[record['id']] for record in records])
+        changed = []
+        for record in records:
+            post = posts.get(mapped[record['id']])
+            if post is None:
+                # Удалён на сайте после прошлого импорта.
+                self.skipped += 1
+                continue
+            self.scopes.add(caching.post_scope(post.id))
+            if post.group_id is not None:
+                self.scopes.add(caching.group_scope(post.group_id))
+            self._fill(post, record)
+            changed.append(post)
+        return changed
+
+    def _posts(self, records):
+        records = {record['id']: record for record in records}
+        mapped = self._mapped(ImportedId.POST, list(records))
+        new, old = [], []
+        for source_id, record in records.items():
+            if record['author'] not in self.users:
+                self.skipped += 1
+            elif source_id in mapped:
+                old.append(record)
+            else:
+                new.append(record)
+        ids = self._assign(
+            Post, ImportedId.POST, [record['id'] for record in new])
+        posts = []
+        for record in new:
+            post = Post(
+                id=ids[record['id']],
+                author_id=self.users[record['author']],
+                pub_date=_datetime(record['pub_date']),
+            )
+            self._fill(post, record)
+            posts.append(post)
+        Post.objects.bulk_create(posts, batch_size=self.batch_size)
+        Post.objects.bulk_update(
+            self._changed(old, mapped),
+            ['group', 'text', 'image', 'updated_at'],
+            batch_size=self.batch_size,
+        )
+
+    def _comments(self, records):
+        post_ids = self._mapped(
+            ImportedId.POST, [record['post'] for record in records])
+        existing = set(Post.objects.filter(
+            id__in=list(post_ids.values())).values_list('id', flat=True))
+        new = []
+        for record in self._new(ImportedId.COMMENT, records):
+            author_id = self.users.get(record['author'])
+            post_id = post_ids.get(record['post'])
+            if author_id is None or post_id not in existing:
+                self.skipped += 1
+                continue
+            new.append((record, post_id, author_id))
+        ids = self._assign(
+            Comment, ImportedId.COMMENT,
+            [record['id'] for record, post_id, author_id in new])
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    id=ids[record['id']],
+                    post_id=post_id,
+                    author_id=author_id,
+                    text=record['text'],
+                    created=_datetime(record['created']),
+                )
+                for record, post_id, author_id in new
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def _follows(self, records):
+        follows = []
+        for record in records:
+            user_id = self.users.get(record['user'])
+            author_id = self.users.get(record['author'])
+            if None in (user_id, author_id) or user_id == author_id:
+                self.skipped += 1
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        Follow.objects.bulk_create(
+            follows, batch_size=self.batch_size, ignore_conflicts=True)
+
+    def import_chunk(self, lines):
+        """Загружает пачку строк и сдвигает контрольную точку в той же
+        транзакции: после сбоя импорт продолжится со следующей пачки.
+        """
+        by_type = {name: [] for name in RECORD_TYPES}
+        for line in lines:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            by_type[record.pop('type')].append(record)
+        for record in by_type['origin']:
+            if not self.checkpoint.origin:
+                self.checkpoint.origin = record['origin']
+        with transaction.atomic():
+            # Первая запись берёт блокировку SQLite на запись: пока пачка
+            # не зафиксирована, сайт не займёт id, которые выдаст _assign.
+            self.checkpoint.lines += len(lines)
+            self.checkpoint.save(
+                update_fields=['lines', 'origin', 'updated_at'])
+            self._users(by_type['user'])
+            self._groups(by_type['group'])
+            self._posts(by_type['post'])
+            self._comments(by_type['comment'])
+            self._follows(by_type['follow'])
+
+    def finish(self):
+        """Отложенное обслуживание: последовательности, поиск, счётчики,
+        ленты и кэш страниц.
+        """
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Group, Post, Comment, Follow])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        if search.is_supported():
+            search.rebuild_index()
+        counters.repair_counters()
+        feeds.rebuild_timelines()
+        caching.bump_generations(*self.scopes)
+        self.checkpoint.finished = True
+        self.checkpoint.triggers_dropped = False
+        self.checkpoint.save(
+            update_fields=['finished', 'triggers_dropped', 'updated_at'])
+
+
+def import_records(lines, source, origin=None, chunk_size=IMPORT_CHUNK_SIZE,
+                   batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Импортирует поток строк NDJSON, продолжая с контрольной точки.
+
+    origin — имя сайта-источника, если его нет в заголовке выгрузки.
+    progress(строк, секунд) вызывается после каждой пачки. Возвращает
+    контрольную точку, число загруженных в этот запуск строк
+    и пропущенных записей.
+    """
+    checkpoint = get_checkpoint(source, origin)
+    restore_search(ImportCheckpoint.objects.exclude(pk=checkpoint.pk))
+    if checkpoint.finished:
+        return checkpoint, 0, 0
+    importer = Importer(checkpoint, batch_size)
+    lines = islice(lines, checkpoint.lines, None)
+    started = time.monotonic()
+    rows = 0
+    # Триггеры полнотекстового индекса срабатывают на каждую строку;
+    # индекс дешевле пересобрать в конце. Отметка в контрольной точке
+    # остаётся, если процесс убьют: триггеры вернёт restore_search.
+    checkpoint.triggers_dropped = True
+    checkpoint.save(update_fields=['triggers_dropped', 'updated_at'])
+    search.drop_triggers()
+    try:
+        with _keep_timestamps():
+            for chunk in batches(lines, chunk_size):
+                importer.import_chunk(chunk)
+                rows += len(chunk)
+                if progress is not None:
+                    progress(rows, time.monotonic() - started)
+    finally:
+        search.create_triggers()
+    importer.finish()
+    return checkpoint, rows, importer.skipped
+
+
+def parse_since(value):
+    """Дата или дата со временем в ISO 8601 для инкрементной выгрузки."""
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Неверная дата: {value}')
+        since = datetime.combine(day, datetime.min.time())
+    if not settings.USE_TZ and timezone.is_aware(since):
+        since = timezone.make_naive(since)
+    return since
+
+
+def _keyset(queryset, fields, batch_size):
+    """Строки queryset пачками по возрастанию id, без OFFSET."""
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).order_by('id')
+            .values('id', *fields)[:batch_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+        yield rows
+
+
+def _lines(record_type, rows, rename=(), drop_id=False):
+    lines = []
+    for row in rows:
+        record = {'type': record_type}
+        for key, value in row.items():
+            if drop_id and key == 'id':
+                continue
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            record[dict(rename).get(key, key)] = value
+        lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+    return ''.join(lines)
+
+
+def export_records(since=None, batch_size=EXPORT_BATCH_SIZE):
+    """Выгрузка в NDJSON, который читает import_records.
+
+    Отдаёт строки пачками: таблицы читаются по ключу id, поэтому память
+    не растёт с размером базы. Первая строка называет сайт, по ней
+    и по id импорт узнаёт уже загруженные посты. С since выгружаются
+    только пользователи, посты и комментарии, появившиеся или изменённые
+    после этой даты; группы и подписки выгружаются целиком, при импорте
+    повторы пропускаются.
+    """
+    yield _lines('origin', [{'origin': export_origin()}])
+    users = User.objects.all()
+    posts = Post.objects.all()
+    comments = Comment.objects.all()
+    if since is not None:
+        users = users.filter(date_joined__gte=since)
+        posts = posts.filter(updated_at__gte=since)
+        comments = comments.filter(created__gte=since)
+    for rows in _keyset(
+            users, ('username', 'first_name', 'last_name'), batch_size):
+        yield _lines('user', rows, drop_id=True)
+    for rows in _keyset(
+            Group.objects.all(), ('slug', 'title', 'description'),
+            batch_size):
+        yield _lines('group', rows, drop_id=True)
+    for rows in _keyset(
+            posts,
+            ('author__username', 'group__slug', 'text', 'pub_date',
+             'updated_at', 'image'),
+            batch_size):
+        yield _lines(
+            'post', rows,
+            rename=(('author__username', 'author'), ('group__slug', 'group')))
+    for rows in _keyset(
+            comments,
+            ('post_id', 'author__username', 'text', 'created'),
+            batch_size):
+        yield _lines(
+            'comment', rows,
+            rename=(('post_id', 'post'), ('author__username', 'author')))
+    for rows in _keyset(
+            Follow.objects.all(), ('user__username', 'author__username'),
+            batch_size):
+        yield _lines(
+            'follow', rows, drop_id=True,
+            rename=(('user__username', 'user'),
+                    ('author__username', 'author')))
+
+
+def encode(chunks, compress=False):
+    """Кодирует поток строк в UTF-8 и по желанию сжимает его gzip на лету."""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode()
+        return
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
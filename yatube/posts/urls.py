@@ -21,6 +21,10 @@ urlpatterns = [
         'posts/<int:post_id>/',
         views.post_detail,
         name='post_detail'),
+    path(
+        'search/',
+        views.search,
+        name='search'),
     path(
         'create/',
         views.post_create,
@@ -33,6 +37,10 @@ urlpatterns = [
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comments_fragment,
+        name='comments'),
     path(
         'follow/',
         views.follow_index,
@@ -1,10 +1,249 @@
+import base64
+import binascii
+import json
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Page, PageNotAnInteger
 from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
 
 POSTS_ON_PAGE = 10
+POSTS_ORDERING = ('-pub_date', '-id')
+COMMENTS_ON_PAGE = 20
+COMMENTS_ORDERING = ('-created', '-id')
+# Старые ссылки ?page=N читаются через OFFSET; глубже этой страницы
+# открывается первая, чтобы запрос не перебирал всю ленту.
+MAX_LEGACY_PAGE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def batches(iterable, size):
+    """Разбивает поток на списки по size элементов."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _serialize_value(value):
+    # DjangoJSONEncoder обрезает микросекунды, а для курсора нужна
+    # точная копия ключа.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError('Значение ключа не сериализуется: %r' % value)
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор без COUNT и OFFSET: страницы ищутся по ключу сортировки.
+
+    Ключ следующей/предыдущей страницы передаётся в непрозрачном курсоре,
+    номер страницы (?page=N) поддерживается только для старых ссылок.
+    Экземпляр обслуживает одну страницу: num_pages известен лишь до
+    следующей за ней, поэтому шаблоны работают с обычным Page.
+    """
+
+    def __init__(self, object_list, per_page, ordering=POSTS_ORDERING):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть числом')
+        if number < 1:
+            raise InvalidPage('Номер страницы меньше 1')
+        return number
+
+    def get_page(self, cursor=None, number=None):
+        try:
+            if cursor:
+                return self.page_for_cursor(cursor)
+            if number:
+                return self.page(number)
+        except InvalidPage:
+            pass
+        return self.page(1)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if number > MAX_LEGACY_PAGE:
+            raise InvalidPage('Слишком далёкая страница')
+        bottom = (number - 1) * self.per_page
+        rows = self._slice(bottom, self.per_page + 1)
+        if not rows and number > 1:
+            raise InvalidPage('На этой странице нет записей')
+        return self._make_page(
+            rows[:self.per_page], number, len(rows) > self.per_page)
+
+    def page_for_cursor(self, cursor):
+        number, reverse, key = self.decode_cursor(cursor)
+        rows = self._seek(key, reverse)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not reverse:
+            return self._make_page(rows, number, has_more)
+        rows.reverse()
+        number = max(number, 2) if has_more else 1
+        return self._make_page(rows, number, True)
+
+    def restore(self, snapshot):
+        """Страница из снимка, сделанного page_snapshot, без запросов к БД."""
+        rows, number, has_next = snapshot
+        return self._make_page(rows, number, has_next)
+
+    def _make_page(self, rows, number, has_next):
+        self.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and page.has_next():
+            page.next_cursor = self.encode_cursor(rows[-1], number + 1)
+        if rows and page.has_previous():
+            page.previous_cursor = self.encode_cursor(
+                rows[0], number - 1, reverse=True)
+        return page
+
+    def encode_cursor(self, obj, number, reverse=False):
+        payload = json.dumps(
+            [number, int(reverse), list(self._key(obj))],
+            default=_serialize_value,
+            separators=(',', ':'),
+        )
+        token = base64.urlsafe_b64encode(payload.encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            number, reverse, values = json.loads(
+                base64.urlsafe_b64decode(padded.encode()).decode())
+            key = tuple(
+                self._to_python(field, value)
+                for field, value in zip(self._fields(), values)
+            )
+        except (binascii.Error, UnicodeError, ValueError, TypeError,
+                ValidationError):
+            raise InvalidPage('Некорректный курсор')
+        if len(key) != len(self.ordering):
+            raise InvalidPage('Некорректный курсор')
+        return self.validate_number(number), bool(reverse), key
+
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _key(self, obj):
+        return tuple(getattr(obj, field) for field in self._fields())
+
+    def _to_python(self, field, value):
+        try:
+            model_field = self.object_list.model._meta.get_field(field)
+        except FieldDoesNotExist:
+            return value
+        return model_field.to_python(value)
+
+    def _slice(self, offset, limit):
+        if hasattr(self.object_list, 'slice'):
+            return self.object_list.slice(offset, limit)
+        ordered = self.object_list.order_by(*self.ordering)
+        return list(ordered[offset:offset + limit])
+
+    def _seek(self, key, reverse):
+        limit = self.per_page + 1
+        if hasattr(self.object_list, 'seek'):
+            return self.object_list.seek(key, reverse, limit)
+        return seek_queryset(
+            self.object_list, self.ordering, key, reverse, limit)
+
+
+def reverse_ordering(ordering):
+    return [
+        name[1:] if name.startswith('-') else '-' + name
+        for name in ordering
+    ]
+
+
+def keyset_queryset(queryset, ordering, key=None, reverse=False):
+    """queryset, упорядоченный по ordering и начинающийся строго после key.
+
+    При reverse=True записи идут в обратную сторону от key.
+    """
+    fields = [name.lstrip('-') for name in ordering]
+    queryset = queryset.order_by(
+        *(reverse_ordering(ordering) if reverse else ordering))
+    if key is None:
+        return queryset
+    condition = Q()
+    for position, name in enumerate(ordering):
+        descending = name.startswith('-') != reverse
+        lookup = '{}__{}'.format(
+            fields[position], 'lt' if descending else 'gt')
+        step = Q(**{lookup: key[position]})
+        for field, value in zip(fields, key[:position]):
+            step &= Q(**{field: value})
+        condition |= step
+    # Нестрогая граница по первому полю даёт SQLite диапазон по индексу.
+    bound = '{}__{}'.format(
+        fields[0], 'lte' if ordering[0].startswith('-') != reverse else 'gte')
+    return queryset.filter(Q(**{bound: key[0]}), condition)
+
+
+def seek_queryset(queryset, ordering, key, reverse, limit):
+    return list(keyset_queryset(queryset, ordering, key, reverse)[:limit])
+
+
+def page_snapshot(page):
+    return list(page.object_list), page.number, page.has_next()
+
+
+def paginator_view(post_list, request, ordering=POSTS_ORDERING):
+    paginator = KeysetPaginator(post_list, POSTS_ON_PAGE, ordering)
+    return paginator.get_page(
+        request.GET.get('cursor'),
+        request.GET.get('page'),
+    )
+
+
+def comments_page(comment_list, cursor=None):
+    """Первая страница комментариев или страница по курсору.
+
+    Некорректный курсор не подменяется первой страницей: фрагмент
+    дописывается к уже показанным комментариям, поэтому InvalidPage.
+    """
+    paginator = KeysetPaginator(
+        comment_list, COMMENTS_ON_PAGE, COMMENTS_ORDERING)
+    if cursor is None:
+        return paginator.page(1)
+    return paginator.page_for_cursor(cursor)
+
 
+def query_budget(limit):
+    """Объявляет потолок SQL-запросов для view.
 
-def paginator_view(post_list, request):
-    paginator = Paginator(post_list, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    Потолок проверяется тестами, а при DEBUG превышение пишется в лог.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.DEBUG:
+                return view(request, *args, **kwargs)
+            start = len(connection.queries)
+            response = view(request, *args, **kwargs)
+            used = len(connection.queries) - start
+            if used > limit:
+                logger.warning(
+                    '%s: %s запросов при бюджете %s',
+                    view.__name__, used, limit)
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
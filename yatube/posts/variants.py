@@ -0,0 +1,153 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import caching
+from .models import ImageVariant, Post
+
+try:
+    import pillow_avif  # noqa: F401 регистрирует AVIF в старом Pillow
+except ImportError:
+    pass
+
+VARIANTS_DIR = 'variants'
+WIDTHS = (480, 960, 1440)
+# Пропорции пресета 960x339 из шаблонов.
+ASPECT = 339 / 960
+SIZES = '(max-width: 960px) 100vw, 960px'
+FALLBACK_WIDTH = 960
+FALLBACK = 'jpeg'
+# Порядок важен: браузер берёт первый поддерживаемый <source>.
+FORMATS = (
+    ('avif', 'image/avif', 'avif', {'quality': 50}),
+    ('webp', 'image/webp', 'webp', {'quality': 80, 'method': 4}),
+    (FALLBACK, 'image/jpeg', 'jpg', {'quality': 85, 'progressive': True}),
+)
+
+
+def supported_formats():
+    Image.init()
+    return [
+        (name, mime, ext, options) for name, mime, ext, options in FORMATS
+        if name.upper() in Image.SAVE
+    ]
+
+
+def _widths(image):
+    widths = [width for width in WIDTHS if width <= image.width]
+    return widths or [WIDTHS[0]]
+
+
+def _variant_name(source, width, ext):
+    stem = os.path.splitext(source)[0]
+    return f'{VARIANTS_DIR}/{stem}/{width}.{ext}'
+
+
+def delete(source):
+    variants = ImageVariant.objects.filter(source=source)
+    for name in variants.values_list('name', flat=True):
+        default_storage.delete(name)
+    variants.delete()
+
+
+def generate(source, force=False):
+    """Создаёт варианты картинки всех ширин во всех доступных форматах."""
+    if force:
+        delete(source)
+    done = set(ImageVariant.objects.filter(source=source).values_list(
+        'format', 'width'))
+    with default_storage.open(source) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    variants = []
+    for width in _widths(image):
+        resized = ImageOps.fit(
+            image, (width, round(width * ASPECT)),
+            Image.Resampling.LANCZOS)
+        for format_name, mime, ext, options in supported_formats():
+            if (format_name, width) in done:
+                continue
+            buffer = BytesIO()
+            resized.save(buffer, format_name.upper(), **options)
+            data = buffer.getvalue()
+            name = _variant_name(source, width, ext)
+            default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(data))
+            variants.append(ImageVariant(
+                source=source,
+                width=width,
+                format=format_name,
+                name=name,
+                size=len(data),
+            ))
+    ImageVariant.objects.bulk_create(variants, ignore_conflicts=True)
+    if variants:
+        _touch_posts(source)
+    return variants
+
+
+def _touch_posts(source):
+    """Сбрасывает кэш постов с картинкой, когда у неё появились варианты.
+
+    Фрагмент поста в кэше ищется по updated_at: без сдвига пост,
+    показанный до вариантов, так и выводился бы без srcset.
+    """
+    posts = Post.objects.filter(image=source)
+    posts.update(updated_at=timezone.now())
+    caching.bump_on_commit(*{
+        scope
+        for post in posts.only('id', 'author', 'group')
+        for scope in caching.post_scopes(post)
+    })
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{default_storage.url(variant.name)} {variant.width}w'
+        for variant in variants
+    )
+
+
+def prefetch(posts):
+    """Одним запросом находит варианты картинок постов.
+
+    Кладёт в post.image_variants источники для <picture>: sources
+    для современных форматов и src/srcset запасного JPEG.
+    """
+    by_source = {}
+    for post in posts:
+        post.image_variants = None
+        if post.image:
+            by_source.setdefault(post.image.name, []).append(post)
+    if not by_source:
+        return
+    found = {}
+    for variant in ImageVariant.objects.filter(
+            source__in=by_source).order_by('width'):
+        found.setdefault(variant.source, {}).setdefault(
+            variant.format, []).append(variant)
+    for source, formats in found.items():
+        fallback = formats.get(FALLBACK)
+        if not fallback:
+            continue
+        src = next(
+            (variant for variant in fallback
+             if variant.width >= FALLBACK_WIDTH),
+            fallback[-1],
+        )
+        image_variants = {
+            'sources': [
+                {'type': mime, 'srcset': _srcset(formats[name])}
+                for name, mime, ext, options in FORMATS
+                if name != FALLBACK and name in formats
+            ],
+            'src': default_storage.url(src.name),
+            'srcset': _srcset(fallback),
+            'sizes': SIZES,
+        }
+        for post in by_source[source]:
+            post.image_variants = image_variants
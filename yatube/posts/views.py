@@ -1,26 +1,70 @@
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import InvalidPage
+from django.http import HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
-from .utils import paginator_view
+from . import caching, thumbnails, variants
+from .feeds import FollowFeed
+from .utils import comments_page, paginator_view, query_budget
 from .forms import PostForm, CommentForm
 from .models import Group, Post, User, Follow
+from .search import search_posts
 
 
-@cache_page(20)
+def _index_scopes(request):
+    return [caching.INDEX]
+
+
+def _group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        return None
+    return [caching.group_scope(group_id)]
+
+
+def _profile_scopes(request, username):
+    author_id = User.objects.filter(
+        username=username, is_active=True).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        return None
+    scopes = [caching.author_scope(author_id), caching.stats_scope(author_id)]
+    if request.user.is_authenticated:
+        # Кнопка подписки зависит от подписок читателя.
+        scopes.append(caching.follows_scope(request.user.pk))
+    return scopes
+
+
+def _post_scopes(request, post_id):
+    post = Post.objects.filter(id=post_id).only('author', 'group').first()
+    if post is None:
+        return None
+    return caching.post_scopes(post) + [caching.USERS]
+
+
+def _follow_scopes(request):
+    return [caching.INDEX, caching.follows_scope(request.user.pk)]
+
+
+@query_budget(3)
+@caching.conditional(_index_scopes)
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = paginator_view(post_list, request)
+    post_list = Post.objects.for_feed()
+    page_obj = caching.cached_page(request, caching.INDEX, post_list)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(5)
+@caching.conditional(_group_scopes)
 def group_post(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paginator_view(post_list, request)
+    group = get_object_or_404(Group, slug=slug, is_active=True)
+    post_list = group.posts.for_feed()
+    page_obj = caching.cached_page(
+        request, caching.group_scope(group.id), post_list)
     context = {
         'group': group,
         'page_obj': page_obj
@@ -28,10 +72,17 @@ def group_post(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(6)
+@caching.conditional(_profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginator_view(post_list, request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username,
+        is_active=True,
+    )
+    post_list = author.posts.for_feed()
+    page_obj = caching.cached_page(
+        request, caching.author_scope(author.id), post_list)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author__username=username).exists()
@@ -43,9 +94,14 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5)
+@caching.conditional(_post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stats'),
+        id=post_id)
+    variants.prefetch([post])
+    comments = comments_page(post.comments.for_feed())
     com_form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -55,7 +111,37 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(3)
+def comments_fragment(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    try:
+        comments = comments_page(
+            post.comments.for_feed(), request.GET.get('cursor'))
+    except InvalidPage as error:
+        return HttpResponseBadRequest(str(error))
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+@query_budget(4)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        results, ordering = search_posts(query)
+        page_obj = paginator_view(results, request, ordering)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@query_budget(3)
 def post_create(request):
     form = PostForm(request.POST or None,
                     files=request.FILES or None)
@@ -63,11 +149,15 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image.name)
+        caching.remember_write(request, *caching.post_scopes(post))
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/create.html', {'form': form})
 
 
 @login_required
+@query_budget(4)
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
@@ -78,7 +168,10 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image.name)
+        caching.remember_write(request, *caching.post_scopes(post))
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -101,9 +194,10 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(6)
+@caching.conditional(_follow_scopes)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator_view(post_list, request)
+    page_obj = paginator_view(FollowFeed(request.user), request)
     following = Follow.objects.filter(
         user=request.user).exists()
     context = {
@@ -115,7 +209,7 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User, username=username, is_active=True)
     if author != request.user:
         Follow.objects.get_or_create(
             user=request.user,
@@ -0,0 +1,19 @@
+// Кнопка «Показать ещё» подгружает следующую страницу комментариев.
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('.js-more-comments');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    fetch(link.href).then(function (response) {
+        if (!response.ok) {
+            throw new Error(response.status);
+        }
+        return response.text();
+    }).then(function (html) {
+        link.insertAdjacentHTML('afterend', html);
+        link.remove();
+    }).catch(function () {
+        link.classList.add('disabled');
+    });
+});
@@ -0,0 +1,16 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+
+from posts.admin import PurgeAdminMixin
+
+User = get_user_model()
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class UserAdmin(PurgeAdminMixin, BaseUserAdmin):
+    """Удаление сразу блокирует пользователя, а посты, комментарии
+    и подписки удаляет фоновое задание пачками.
+    """
@@ -74,6 +74,18 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+# Применяются к каждому соединению (core.db). WAL не даёт читателям
+# ждать пишущий запрос, busy_timeout — писателям падать с
+# «database is locked», пока другой писатель держит блокировку.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Отрицательное значение — размер в КиБ, а не в страницах.
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'memory'),
+}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -117,9 +129,37 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# X-Accel-Redirect (nginx) или X-Sendfile (Apache, lighttpd): файлы
+# отдаёт прокси, приложение только проверяет путь и заголовки.
+MEDIA_SENDFILE_HEADER = os.getenv('MEDIA_SENDFILE_HEADER', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv(
+    'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', 5000))
+POSTS_PAGE_CACHE_TIMEOUT = int(os.getenv('POSTS_PAGE_CACHE_TIMEOUT', 600))
+POSTS_PAGE_STALE_TIMEOUT = int(os.getenv('POSTS_PAGE_STALE_TIMEOUT', 300))
+POSTS_PAGE_LEASE_TIMEOUT = int(os.getenv('POSTS_PAGE_LEASE_TIMEOUT', 10))
+POSTS_ARTICLE_CACHE_TIMEOUT = int(
+    os.getenv('POSTS_ARTICLE_CACHE_TIMEOUT', 60 * 60 * 24))
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
     }
 }
+THUMBNAIL_CACHE = 'default'
+# 0 — создавать миниатюры сразу после коммита, без фонового потока.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+PURGE_WORKERS = int(os.getenv('PURGE_WORKERS', 1))
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', 1))
+PURGE_CHUNK_SIZE = int(os.getenv('PURGE_CHUNK_SIZE', 500))
+# Имя сайта в заголовке выгрузки: по нему импорт узнаёт уже загруженные
+# посты. Пустое — производное от SECRET_KEY.
+EXPORT_ORIGIN = os.getenv('EXPORT_ORIGIN', '')
+
+TEST_RUNNER = 'core.runner.TestRunner'